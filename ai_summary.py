@@ -1,32 +1,149 @@
-from langchain_ollama import ChatOllama
-from langchain.schema import SystemMessage, HumanMessage
+from summary_cache import SummaryCache, cache_key
 import difflib
 import os
+import threading
+import time
+import perf
 
 USE_AI = os.getenv("USE_AI", "false").lower() == "true"
+MODEL_NAME = os.getenv("AI_MODEL", "mistral")
+SUMMARY_CACHE_ENABLED = os.getenv("SUMMARY_CACHE", "true").lower() == "true"
 
-if USE_AI:
-    from langchain_ollama import ChatOllama
-    from langchain.schema import SystemMessage, HumanMessage
-    llm = ChatOllama(model="mistral", temperature=0.2)
+SYSTEM_PROMPT = "You are a ServiceNow expert. Focus on describing only the modified parts of each field, especially large code blocks."
+DISABLED_MESSAGE = "🧠 AI summary disabled in cloud environment."
+ERROR_PREFIX = "⚠️ Error generating summary:"
 
-def summarize_changes(name, diffs):
+# O langchain leva cerca de 1s para importar, então o ChatOllama só é criado no primeiro get_llm()
+llm = None
+_llm_loaded = False
+_llm_lock = threading.Lock()
+summary_cache = None
+
+
+class EchoLLM:
+    # Substituto local do ChatOllama para testes e benchmarks: mesma interface invoke(messages) -> .content
+
+    class _Response:
+        def __init__(self, content):
+            self.content = content
+
+    model = "echo"
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = 0
+
+    def invoke(self, messages):
+        self.calls += 1
+        if self.delay:
+            time.sleep(self.delay)
+        prompt = messages[-1].content
+        sections = [line for line in prompt.splitlines() if line.startswith("### [")]
+        if sections:
+            return self._Response("\n".join(f"{section}\nEcho summary." for section in sections))
+        return self._Response(f"Echo summary of {len(prompt)} prompt chars.")
+
+
+def set_llm(new_llm):
+    # Permite injetar outro modelo (ex.: EchoLLM) sem depender do USE_AI
+    global llm, _llm_loaded
+    llm = new_llm
+    _llm_loaded = True
+
+
+def get_llm():
+    global llm, _llm_loaded
+    if not _llm_loaded:
+        with _llm_lock:
+            if not _llm_loaded:
+                if USE_AI:
+                    from langchain_ollama import ChatOllama
+                    llm = ChatOllama(model=MODEL_NAME, temperature=0.2)
+                _llm_loaded = True
+    return llm
+
+
+def is_generated_summary(summary):
+    # Só resumos que vieram do modelo; o aviso de IA desligada e as mensagens de erro não são salvos
+    return bool(summary) and summary != DISABLED_MESSAGE and not summary.startswith(ERROR_PREFIX)
+
+
+def warm_up():
+    # Cria o modelo e importa as mensagens do langchain antes do primeiro resumo (ver warmup.py)
+    if get_llm() is not None:
+        _messages("")
+
+
+def get_summary_cache():
+    # Criado sob demanda para não tocar no disco quando a IA está desligada
+    global summary_cache
+    if summary_cache is None and SUMMARY_CACHE_ENABLED:
+        summary_cache = SummaryCache()
+    return summary_cache
+
+
+def set_summary_cache(cache):
+    global summary_cache, SUMMARY_CACHE_ENABLED
+    summary_cache = cache
+    SUMMARY_CACHE_ENABLED = cache is not None
+
+
+def summary_key(prompt):
+    return cache_key(getattr(get_llm(), "model", MODEL_NAME), SYSTEM_PROMPT, prompt)
+
+
+def cached_summary(prompt):
+    cache = get_summary_cache()
+    return cache.get(summary_key(prompt)) if cache is not None else None
+
+
+def store_summary(prompt, summary):
+    cache = get_summary_cache()
+    if cache is not None:
+        cache.put(summary_key(prompt), summary)
+
+
+def diff_text(values):
+    before_lines = values['before'].splitlines()
+    after_lines = values['after'].splitlines()
+    diff = difflib.unified_diff(before_lines, after_lines, fromfile='before', tofile='after', lineterm='')
+    return '\n'.join(diff)
+
+
+def build_prompt(name, diffs):
     prompt = (
         f"Summarize only the meaningful modifications made to the record '{name}'. "
         "Focus especially on code fields by describing only what was changed.\n"
     )
     for field, values in diffs.items():
-        before_lines = values['before'].splitlines()
-        after_lines = values['after'].splitlines()
-        diff = difflib.unified_diff(before_lines, after_lines, fromfile='before', tofile='after', lineterm='')
-        diff_text = '\n'.join(diff)
-        prompt += f"\n[{field.upper()}] DIFF:\n{diff_text}\n"
-    messages = [
-        SystemMessage(content="You are a ServiceNow expert. Focus on describing only the modified parts of each field, especially large code blocks."),
+        prompt += f"\n[{field.upper()}] DIFF:\n{diff_text(values)}\n"
+    return prompt
+
+
+def _messages(prompt):
+    from langchain.schema import SystemMessage, HumanMessage
+
+    return [
+        SystemMessage(content=SYSTEM_PROMPT),
         HumanMessage(content=prompt)
     ]
 
-    if not USE_AI:
-        return "🧠 AI summary disabled in cloud environment."
-    response = llm(messages)
+
+def ask_llm(prompt):
+    messages = _messages(prompt)
+    with perf.stage("llm.call"):
+        response = get_llm().invoke(messages)
     return response.content
+
+
+def summarize_changes(name, diffs):
+    prompt = build_prompt(name, diffs)
+    if get_llm() is None:
+        return DISABLED_MESSAGE
+    summary = cached_summary(prompt)
+    if summary is None:
+        # Latência por registro; no agendador em lote ela é registrada em SchedulerStats.record_call
+        with perf.stage("llm.record"):
+            summary = ask_llm(prompt)
+        store_summary(prompt, summary)
+    return summary
@@ -0,0 +1,187 @@
+# Índice pré-compilado das versões base (BASE_VERSION_PATHS)
+#
+# Cada XML base é extraído uma única vez e gravado em SQLite, com nome igual ao
+# hash do conteúdo do arquivo. Enquanto o XML não mudar, as execuções seguintes
+# só leem o índice; dentro do processo, um LRU evita até essa leitura. Registros
+# lidos do índice guardam só nome, classe e digests; o texto dos campos é buscado
+# no SQLite quando alguém pede (na prática, só para registros modificados).
+from utils import iter_base_records, Record, DECODE_WORKERS
+from collections import defaultdict
+from functools import lru_cache
+import hashlib
+import json
+import perf
+import os
+import sqlite3
+import tempfile
+import threading
+from urllib.parse import quote
+
+CACHE_DIR = os.getenv("BASE_CACHE_DIR", os.path.join(".cache", "base_index"))
+INDEX_FORMAT_VERSION = "3"
+
+_build_locks = {}
+_build_locks_guard = threading.Lock()
+
+
+def file_content_hash(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+@perf.timed("base_index.load")
+def load_base_index(path):
+    # A chave do LRU usa mtime/tamanho, então trocar de versão no selectbox não relê nada do disco
+    stat = os.stat(path)
+    return _load_index_cached(os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+
+def build_lock(name):
+    # Um lock por índice: sessões do Streamlit (threads do mesmo processo) que pedem o mesmo
+    # índice esperam a primeira montá-lo em vez de montarem juntas
+    with _build_locks_guard:
+        return _build_locks.setdefault(name, threading.Lock())
+
+
+def replace_atomically(path, write):
+    # write(tmp_path) grava um arquivo temporário único (mkstemp) que depois substitui path atomicamente
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    os.close(fd)
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _source_content_hash(path, mtime_ns, size):
+    # Guarda o hash por (caminho, mtime, tamanho) para não reler XMLs de centenas de MB a cada início
+    sources_path = os.path.join(CACHE_DIR, "sources.json")
+    try:
+        with open(sources_path, encoding="utf-8") as f:
+            sources = json.load(f)
+    except (OSError, ValueError):
+        sources = {}
+    entry = sources.get(path)
+    if entry and entry["mtime_ns"] == mtime_ns and entry["size"] == size:
+        return entry["sha256"]
+    content_hash = file_content_hash(path)
+    sources[path] = {"mtime_ns": mtime_ns, "size": size, "sha256": content_hash}
+
+    def write(tmp_path):
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(sources, f)
+
+    replace_atomically(sources_path, write)
+    return content_hash
+
+
+@lru_cache(maxsize=8)
+def _load_index_cached(path, mtime_ns, size):
+    with build_lock(path):
+        content_hash = _source_content_hash(path, mtime_ns, size)
+        db_path = os.path.join(CACHE_DIR, f"{content_hash}.sqlite")
+        index = read_index(db_path) if os.path.exists(db_path) else None
+        if index is None:
+            write_index(db_path, build_base_index(path, content_hash))
+            index = read_index(db_path)
+        return index
+
+
+@perf.timed("base_index.build")
+def build_base_index(path, content_hash=None, workers=None):
+    records = dict(perf.timed_iter("parse_base", iter_base_records(path, workers=workers or DECODE_WORKERS)))
+    return {
+        "source_hash": content_hash or file_content_hash(path),
+        "records": records,
+        "by_class": _keys_by_class(records),
+    }
+
+
+def _keys_by_class(records):
+    by_class = defaultdict(list)
+    for key, record in records.items():
+        by_class[record.class_name].append(key)
+    return dict(by_class)
+
+
+def write_index(db_path, index):
+    def write(tmp_path):
+        conn = sqlite3.connect(tmp_path)
+        try:
+            conn.executescript("""
+                CREATE TABLE meta (name TEXT PRIMARY KEY, value TEXT);
+                CREATE TABLE records (key TEXT PRIMARY KEY, name TEXT, class TEXT, fields TEXT, digests BLOB, digest TEXT);
+            """)
+            conn.executemany("INSERT INTO meta VALUES (?, ?)", [
+                ("format_version", INDEX_FORMAT_VERSION),
+                ("source_hash", index["source_hash"]),
+            ])
+            conn.executemany("INSERT INTO records VALUES (?, ?, ?, ?, ?, ?)", (
+                (key, r.name, r.class_name, json.dumps(r.values), r.digests, r.digest)
+                for key, r in index["records"].items()
+            ))
+            conn.commit()
+        finally:
+            conn.close()
+
+    # Grava em arquivo temporário e troca atomicamente para não expor índices pela metade
+    replace_atomically(db_path, write)
+
+
+def read_index(db_path):
+    try:
+        conn = sqlite3.connect(db_path)
+        try:
+            meta = dict(conn.execute("SELECT name, value FROM meta"))
+            if meta.get("format_version") != INDEX_FORMAT_VERSION:
+                return None
+            load_values = IndexValues(db_path)
+            records = {
+                key: Record(key, name, class_name, None, digests, digest, load_values)
+                for key, name, class_name, digests, digest in conn.execute(
+                    "SELECT key, name, class, digests, digest FROM records"
+                )
+            }
+        finally:
+            conn.close()
+    except sqlite3.DatabaseError as e:
+        perf.log_error("base_index.load", f"⚠️ Índice base inválido em {db_path}, reconstruindo: {e}")
+        return None
+    return {"source_hash": meta.get("source_hash"), "records": records, "by_class": _keys_by_class(records)}
+
+
+class IndexValues:
+    # Lê os valores de um registro do índice, com uma conexão somente leitura por thread.
+    # No pickle (st.cache_data, pool de processos) vai só o caminho.
+    def __init__(self, db_path):
+        self.db_path = os.path.abspath(db_path)
+        self._local = threading.local()
+
+    def __getstate__(self):
+        return {"db_path": self.db_path}
+
+    def __setstate__(self, state):
+        self.__init__(state["db_path"])
+
+    def __call__(self, key):
+        conn = getattr(self._local, "conn", None)
+        # Conexões SQLite não podem ser usadas depois de um fork, então cada processo abre a sua
+        if conn is None or self._local.pid != os.getpid():
+            conn = self._local.conn = sqlite3.connect(f"file:{quote(self.db_path)}?mode=ro", uri=True)
+            self._local.pid = os.getpid()
+        row = conn.execute("SELECT fields FROM records WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return tuple(json.loads(row[0]))
+
+
+def clear_memory_cache():
+    _load_index_cached.cache_clear()
@@ -0,0 +1,216 @@
+# Modo batch sem interface: compara vários update sets de clientes contra várias versões base
+#
+# Uso:
+#   python batch.py CUSTOM_DIR --versions v7.6 v8.1.0 --out results/ [--workers 4] [--format jsonl csv] [--summaries]
+#                  [--search TERMO [--regex] [--case-sensitive]]
+#
+# Cada arquivo custom é extraído uma única vez e comparado com todas as versões pedidas.
+# Os índices base são carregados no processo pai (base_cache) antes de criar o pool; com
+# fork os workers herdam o LRU já preenchido, e nos demais casos leem o índice em SQLite.
+from ai_summary import get_llm
+from base_cache import load_base_index
+from compare import compare_records
+from manifest import RunManifest, apply_manifest, update_manifest
+from search_index import SearchIndex, load_search_index, search
+from utils import BASE_VERSION_PATHS, write_table
+from ingest import iter_mapped_custom_records
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import argparse
+import os
+import re
+import perf
+
+RESULT_COLUMNS = ["key", "name", "class", "status", "changed_fields", "recomputed", "summary"]
+SEARCH_COLUMNS = ["custom", "version", "status", "key", "name", "class", "field", "lines", "snippet"]
+PAIR_COLUMNS = ["custom", "version", "new", "modified", "unchanged", "reused", "output"]
+
+_base_indexes = {}
+
+
+def resolve_versions(versions):
+    # Aceita nomes de BASE_VERSION_PATHS ou caminhos diretos para XMLs base
+    resolved = {}
+    for version in versions:
+        path = BASE_VERSION_PATHS.get(version, version)
+        if not os.path.exists(path):
+            raise SystemExit(f"⚠️ Base version not found: {version} ({path})")
+        label = version if version in BASE_VERSION_PATHS else os.path.splitext(os.path.basename(path))[0]
+        resolved[label] = path
+    return resolved
+
+
+def _init_worker(version_paths):
+    for version, path in version_paths.items():
+        _base_indexes[version] = load_base_index(path)
+
+
+def comparison_rows(comparison):
+    for status in ("new", "modified", "unchanged"):
+        for key, record in comparison[status].items():
+            changed = list(record.differences) if status == "modified" else []
+            yield {
+                "key": key,
+                "name": record.name,
+                "class": record.class_name,
+                "status": status,
+                "changed_fields": changed,
+                "recomputed": record.recomputed,
+                "summary": record.summary or "",
+            }
+
+
+def _add_summaries(comparison):
+    from summary_scheduler import summarize_many, summary_diffs
+
+    # Registros com resumo reaproveitado do manifesto não voltam para o LLM
+    jobs = [
+        ((status, key), f"{record.name} ({key})", summary_diffs(status, record))
+        for status in ("new", "modified")
+        for key, record in comparison[status].items()
+        if record.summary is None
+    ]
+    for (status, key), summary in summarize_many(jobs):
+        comparison[status][key].summary = summary
+
+
+def write_rows(rows, out_base, formats):
+    write_table(rows, out_base, formats, RESULT_COLUMNS,
+                lambda row: {**row, "changed_fields": ";".join(row["changed_fields"])})
+
+
+def process_custom_file(custom_path, versions, out_dir, formats, summaries, search_query=None):
+    # search_query: (termo, regex, case_sensitive); os hits do custom são buscados uma vez e
+    # repetidos por versão com o status daquela comparação
+    custom_records = dict(perf.timed_iter("parse_custom", iter_mapped_custom_records(custom_path)))
+    stem = os.path.splitext(os.path.basename(custom_path))[0]
+    hits = search(SearchIndex.build(custom_records), custom_records, *search_query) if search_query else []
+    pairs = []
+    search_rows = []
+    for version in versions:
+        base_index = _base_indexes[version]
+        comparison = compare_records(base_index["records"], custom_records)
+        # O nome do arquivo identifica o cliente no manifesto da execução anterior
+        manifest = RunManifest(stem, base_index["source_hash"])
+        reused = apply_manifest(comparison, base_index["records"], manifest)
+        # Sem modelo (USE_AI=false), --summaries só geraria o aviso de IA desligada
+        if summaries and get_llm() is not None:
+            _add_summaries(comparison)
+        update_manifest(comparison, base_index["records"], manifest, store_summaries=summaries)
+        out_base = os.path.join(out_dir, f"{stem}__{version}")
+        write_rows(comparison_rows(comparison), out_base, formats)
+        statuses = {key: status for status, records in comparison.items() for key in records}
+        search_rows.extend({"custom": stem, "version": version, "status": statuses[hit["key"]], **hit} for hit in hits)
+        pairs.append({
+            "custom": custom_path,
+            "version": version,
+            "new": len(comparison["new"]),
+            "modified": len(comparison["modified"]),
+            "unchanged": len(comparison["unchanged"]),
+            "reused": reused,
+            "output": out_base,
+        })
+    return pairs, search_rows
+
+
+def _process_custom_file_task(*args):
+    # Cada tarefa devolve as métricas do worker junto com o resultado, para o pai consolidar
+    perf.reset()
+    try:
+        pairs, search_rows = process_custom_file(*args)
+    except Exception as e:
+        # Exceções do lxml não atravessam o pickle do pool; vai só a mensagem
+        raise RuntimeError(f"{type(e).__name__}: {e}") from None
+    return pairs, search_rows, perf.snapshot(include_samples=True)
+
+
+def write_perf(out_dir):
+    data = perf.snapshot()
+    with open(os.path.join(out_dir, "perf.json"), "w", encoding="utf-8") as f:
+        f.write(perf.to_json(data))
+    with open(os.path.join(out_dir, "perf.prom"), "w", encoding="utf-8") as f:
+        f.write(perf.to_prometheus(data))
+
+
+def search_base_versions(version_paths, search_query):
+    # Cada versão base é buscada uma vez, pelo índice persistido ao lado do cache base
+    rows = []
+    for version, path in version_paths.items():
+        index, base_index = load_search_index(path)
+        rows.extend({"custom": "", "version": version, "status": "base", **hit} for hit in search(index, base_index["records"], *search_query))
+    return rows
+
+
+def write_search_rows(rows, out_base, formats):
+    write_table(rows, out_base, formats, SEARCH_COLUMNS, lambda row: {**row, "lines": ";".join(map(str, row["lines"]))})
+
+
+def run_batch(custom_paths, version_paths, out_dir, formats=("jsonl",), workers=None, summaries=False, search_query=None):
+    os.makedirs(out_dir, exist_ok=True)
+    # Preenche o LRU/cache em disco uma vez no pai; os workers reaproveitam
+    _init_worker(version_paths)
+    versions = list(version_paths)
+    pairs = []
+    search_rows = search_base_versions(version_paths, search_query) if search_query else []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(version_paths,)) as pool:
+        futures = {
+            pool.submit(_process_custom_file_task, path, versions, out_dir, formats, summaries, search_query): path
+            for path in custom_paths
+        }
+        for future in as_completed(futures):
+            try:
+                file_pairs, file_search_rows, worker_perf = future.result()
+            except Exception as e:
+                perf.log_error("batch", f"⚠️ Erro ao processar {futures[future]}: {e}")
+                continue
+            perf.merge(worker_perf)
+            search_rows.extend(file_search_rows)
+            for pair in file_pairs:
+                print(f"✅ {os.path.basename(pair['custom'])} x {pair['version']}: "
+                      f"{pair['new']} new, {pair['modified']} modified, {pair['unchanged']} unchanged, {pair['reused']} reused")
+            pairs.extend(file_pairs)
+    pairs.sort(key=lambda pair: (pair["custom"], versions.index(pair["version"])))
+    write_pairs(pairs, os.path.join(out_dir, "summary"), formats)
+    if search_query:
+        search_rows.sort(key=lambda row: (row["custom"], row["version"], row["key"], row["field"]))
+        write_search_rows(search_rows, os.path.join(out_dir, "search"), formats)
+        print(f"🔎 {len(search_rows)} matches for {search_query[0]!r} in {os.path.join(out_dir, 'search')}.*")
+    write_perf(out_dir)
+    return pairs
+
+
+def write_pairs(pairs, out_base, formats):
+    write_table(pairs, out_base, formats, PAIR_COLUMNS)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compara update sets de clientes contra versões base, sem Streamlit")
+    parser.add_argument("custom_dir", help="diretório com os XMLs customizados (*.xml)")
+    parser.add_argument("--versions", nargs="+", default=list(BASE_VERSION_PATHS),
+                        help="nomes em BASE_VERSION_PATHS ou caminhos de XMLs base (padrão: todas)")
+    parser.add_argument("--out", default="results", help="diretório de saída")
+    parser.add_argument("--workers", type=int, default=None, help="processos no pool (padrão: núcleos da CPU)")
+    parser.add_argument("--format", nargs="+", choices=["jsonl", "csv"], default=["jsonl"], dest="formats")
+    parser.add_argument("--summaries", action="store_true", help="gera resumos com IA (requer USE_AI=true)")
+    parser.add_argument("--search", default=None, help="busca o termo em script/condition/filter_condition/template")
+    parser.add_argument("--regex", action="store_true", help="interpreta --search como expressão regular")
+    parser.add_argument("--case-sensitive", action="store_true", help="diferencia maiúsculas de minúsculas na busca")
+    args = parser.parse_args(argv)
+
+    custom_paths = sorted(
+        os.path.join(args.custom_dir, name) for name in os.listdir(args.custom_dir) if name.lower().endswith(".xml")
+    )
+    if not custom_paths:
+        raise SystemExit(f"⚠️ No .xml files found in {args.custom_dir}")
+    if args.search and args.regex:
+        try:
+            re.compile(args.search)
+        except re.error as e:
+            raise SystemExit(f"⚠️ Invalid regex: {e}")
+    search_query = (args.search, args.regex, args.case_sensitive) if args.search else None
+    if args.summaries and get_llm() is None:
+        print("⚠️ --summaries ignored: AI is disabled (set USE_AI=true)")
+    run_batch(custom_paths, resolve_versions(args.versions), args.out, args.formats, args.workers, args.summaries, search_query)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+# Benchmark: comparação legada (.strip() em todos os campos) x motor hash-first (compare.compare_records)
+#
+# Uso: python benchmarks/bench_compare.py [--records 20000] [--script-kb 4] [--change-ratio 0.1]
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from compare import compare_records
+from utils import FIELDS_TO_COMPARE, Record
+
+
+def make_records(count, script_kb, change_ratio, seed=42):
+    rng = random.Random(seed)
+    line = "var gr = new GlideRecord('incident'); gr.addQuery('active', true); gr.query();\n"
+    script = line * max(1, script_kb * 1024 // len(line))
+    base, custom = {}, {}
+    for i in range(count):
+        fields = {field: "" for field in FIELDS_TO_COMPARE}
+        fields.update({"script": f"// {i}\n" + script, "template": script[:512], "active": "true", "order": "100"})
+        key = f"sys_script_{i:032x}"
+        base[key] = {"name": f"Rule {i}", "fields": fields, "class": "sys_script"}
+        custom_fields = dict(fields)
+        if rng.random() < change_ratio:
+            custom_fields["script"] = custom_fields["script"] + "gs.info('custom');\n"
+        custom[key] = {"name": f"Rule {i}", "fields": custom_fields, "class": "sys_script"}
+    return base, custom
+
+
+def legacy_compare(base_records, custom_records):
+    new_records, modified_records, unchanged_records = {}, {}, {}
+    for key, record in custom_records.items():
+        if key not in base_records:
+            new_records[key] = record
+            continue
+        diffs = {}
+        base_fields = base_records[key]["fields"]
+        for field in FIELDS_TO_COMPARE:
+            if base_fields[field].strip() != record["fields"][field].strip():
+                diffs[field] = {"before": base_fields[field], "after": record["fields"][field]}
+        if diffs:
+            modified_records[key] = {"name": record["name"], "differences": diffs, "class": record["class"]}
+        else:
+            unchanged_records[key] = record
+    return {"new": new_records, "modified": modified_records, "unchanged": unchanged_records}
+
+
+def timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - started, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara a comparação legada com a hash-first")
+    parser.add_argument("--records", type=int, default=20000)
+    parser.add_argument("--script-kb", type=int, default=4)
+    parser.add_argument("--change-ratio", type=float, default=0.1)
+    args = parser.parse_args()
+
+    base, custom = make_records(args.records, args.script_kb, args.change_ratio)
+    legacy_time, legacy = timed(legacy_compare, base, custom)
+
+    # Os digests são calculados na extração (e ficam no índice da base), então são medidos à parte
+    started = time.perf_counter()
+    base, custom = (
+        {key: Record(key, r["name"], r["class"], tuple(r["fields"][f] for f in FIELDS_TO_COMPARE)) for key, r in records.items()}
+        for records in (base, custom)
+    )
+    digest_time = time.perf_counter() - started
+    hashed_time, hashed = timed(compare_records, base, custom)
+
+    assert legacy["modified"].keys() == hashed["modified"].keys()
+    assert legacy["unchanged"].keys() == hashed["unchanged"].keys()
+    print(f"records={args.records} script={args.script_kb}KB modified={len(hashed['modified'])}")
+    print(f"legacy strip compare : {legacy_time * 1000:9.1f} ms")
+    print(f"hash-first compare   : {hashed_time * 1000:9.1f} ms")
+    print(f"digests (extraction) : {digest_time * 1000:9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
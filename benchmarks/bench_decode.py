@@ -0,0 +1,52 @@
+# Benchmark: decodificação dos payloads de sys_update_xml em série x pool de processos
+#
+# Uso: python benchmarks/bench_decode.py [--copies 80 320] [--workers 1 2 4 8] [--chunk-size 256]
+#
+# O custom.xml é inflado como no bench_streaming; cada linha mostra o tempo de
+# iter_base_records com N processos e o ganho sobre o caminho serial (workers=1).
+# O ganho depende dos núcleos disponíveis (os.cpu_count() aparece no cabeçalho).
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_streaming import inflate
+from utils import iter_base_records
+
+
+def timed(path, workers, chunk_size):
+    started = time.perf_counter()
+    records = dict(iter_base_records(path, workers=workers, chunk_size=chunk_size))
+    return time.perf_counter() - started, records
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Decodificação de payloads em série x pool de processos")
+    parser.add_argument("--copies", type=int, nargs="+", default=[80, 320])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--chunk-size", type=int, default=256)
+    args = parser.parse_args()
+
+    print(f"cpus: {os.cpu_count()}")
+    print(f"{'copies':>7} {'size MB':>8} {'workers':>8} {'time s':>8} {'speedup':>8} {'records':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for copies in args.copies:
+            path = os.path.join(tmp, f"inflated_{copies}.xml")
+            inflate(copies, path)
+            size_mb = os.path.getsize(path) / 1024 / 1024
+            serial_time, expected = timed(path, 1, args.chunk_size)
+            for workers in args.workers:
+                elapsed, records = (serial_time, expected) if workers == 1 else timed(path, workers, args.chunk_size)
+                if records != expected:
+                    print(f"⚠️ Resultado diferente do serial com {workers} workers")
+                print(f"{copies:>7} {size_mb:>8.1f} {workers:>8} {elapsed:>8.3f} {serial_time / elapsed:>7.2f}x {len(records):>8}")
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
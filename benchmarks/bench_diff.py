@@ -0,0 +1,54 @@
+# Benchmark: SequenceMatcher x diff por hash de linha (diff_model.line_hash_opcodes) em scripts longos
+#
+# Uso: python benchmarks/bench_diff.py [--lines 2000 10000 40000] [--edits 40]
+import argparse
+import difflib
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from diff_model import line_hash_opcodes
+
+
+def make_script(lines, edits, seed=7):
+    rng = random.Random(seed)
+    # Scripts reais repetem muito "}", "" e chamadas parecidas; isso é o que pesa no SequenceMatcher
+    templates = ["}}", "", "var gr = new GlideRecord('{t}');", "gr.addQuery('active', true);", "if (gr.next()) {{", "gs.info('{t} {i}');"]
+    before = [rng.choice(templates).format(t=f"table_{i % 40}", i=i) for i in range(lines)]
+    after = list(before)
+    for _ in range(edits):
+        position = rng.randrange(len(after))
+        if rng.random() < 0.5:
+            after[position] = f"gs.warn('custom {position}');"
+        else:
+            after.insert(position, f"// customized at {position}")
+    return before, after
+
+
+def timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - started, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara SequenceMatcher com o diff por hash de linha")
+    parser.add_argument("--lines", type=int, nargs="+", default=[2000, 10000, 40000])
+    parser.add_argument("--edits", type=int, default=40)
+    args = parser.parse_args()
+
+    print(f"{'lines':>7} {'SequenceMatcher s':>18} {'line-hash s':>12} {'changed lines':>14}")
+    for lines in args.lines:
+        before, after = make_script(lines, args.edits)
+        sm_time, _ = timed(lambda: difflib.SequenceMatcher(None, before, after).get_opcodes())
+        lh_time, opcodes = timed(line_hash_opcodes, before, after)
+        changed = sum(j2 - j1 for tag, i1, i2, j1, j2 in opcodes if tag != "equal")
+        print(f"{lines:>7} {sm_time:>18.3f} {lh_time:>12.3f} {changed:>14}")
+
+
+if __name__ == "__main__":
+    main()
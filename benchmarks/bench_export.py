@@ -0,0 +1,67 @@
+# Benchmark: tempo e pico de memória dos writers de export (CSV, HTML, DOCX, PDF)
+#
+# Uso: python benchmarks/bench_export.py [--records 5000] [--formats csv html docx pdf]
+#
+# Cada formato roda em um subprocesso separado para que o pico de RSS seja só dele.
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def make_results(count, script_lines=60):
+    from diff_model import compute_record_diff
+
+    before = "\n".join(f"var gr{i} = new GlideRecord('incident'); gr{i}.query();" for i in range(script_lines))
+    for i in range(count):
+        if i % 4 == 0:
+            yield {"name": f"New rule {i} (sys_script_{i})", "key": f"sys_script_{i}", "type": "new",
+                   "summary": f"Adds rule {i}.", "class": "sys_script", "recomputed": True,
+                   "before": "", "after": str({"script": before})}
+            continue
+        after = before.replace(f"gr{i % script_lines} ", f"grCustom{i} ") + f"\ngs.info('custom {i}');"
+        yield {"name": f"Rule {i} (sys_script_{i})", "key": f"sys_script_{i}", "type": "modified",
+               "summary": f"Customizes rule {i}.", "class": "sys_script", "recomputed": i % 3 != 0,
+               "diffs": compute_record_diff({"script": {"before": before, "after": after}})}
+
+
+def measure(fmt, records, path):
+    from export import EXPORT_FORMATS
+
+    writer = EXPORT_FORMATS[fmt][3]
+    started = time.perf_counter()
+    writer(make_results(records), path)
+    elapsed = time.perf_counter() - started
+    print(f"{elapsed:.3f} {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss} {os.path.getsize(path)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mede os writers de export em segundo plano")
+    parser.add_argument("--records", type=int, default=5000)
+    parser.add_argument("--formats", nargs="+", default=["csv", "html", "docx", "pdf"])
+    parser.add_argument("--measure", nargs=3, metavar=("FORMAT", "RECORDS", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        measure(args.measure[0], int(args.measure[1]), args.measure[2])
+        return
+
+    print(f"{'format':>6} {'records':>8} {'time s':>8} {'peak RSS MB':>12} {'output MB':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for fmt in args.formats:
+            path = os.path.join(tmp, f"report.{fmt}")
+            output = subprocess.check_output(
+                [sys.executable, __file__, "--measure", fmt, str(args.records), path], text=True
+            )
+            elapsed, peak_kb, size = output.split()
+            print(f"{fmt:>6} {args.records:>8} {float(elapsed):>8.2f} {int(peak_kb) / 1024:>12.1f} {int(size) / 1024 / 1024:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
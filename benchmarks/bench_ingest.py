@@ -0,0 +1,164 @@
+# Benchmark: ingestão do XML customizado enviado pela interface
+#
+# Uso: python benchmarks/bench_ingest.py [CUSTOM.xml] [--records 20000] [--script-lines 20 200]
+#
+# "upload" reproduz o caminho antigo da interface: o arquivo inteiro em memória (como o
+# UploadedFile do Streamlit) passado ao iterparse, com o texto de todos os campos nos registros.
+# "mmap" é o caminho novo: spool em disco (ingest.spool_upload) e scanner sobre o arquivo
+# mapeado, com os campos lidos sob demanda. Cada modo roda num subprocesso para o pico de RSS
+# ser independente; "heap MB" é o que os registros retêm no heap do Python depois da extração.
+# Antes das medidas, o scanner é conferido contra o iterparse (utils.iter_custom_records) no
+# custom.xml do repositório, nos documentos de EDGE_CASES e no arquivo medido; sai com 1 se divergir.
+import argparse
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Casos que o scanner trata à mão: CDATA, entidades, CRLF, NBSP nas pontas, filhos, BOM, comentários
+EDGE_CASES = {
+    "cdata": b"<unload><sys_script><sys_id>1</sys_id><name>a</name>"
+             b"<script><![CDATA[if (a < b && c) { x(); }]]></script></sys_script></unload>",
+    "cdata_mixed": b"<unload><sys_script><sys_id>2</sys_id>"
+                   b"<script>  antes <![CDATA[<meio>]]> depois &amp; fim  </script></sys_script></unload>",
+    "entities": b"<unload><sys_script><sys_id>3</sys_id><name>a &amp; b</name>"
+                b"<condition>x &lt; 1 &gt; 2 &quot;&apos; &#233;&#x20AC;</condition></sys_script></unload>",
+    "crlf": b"<unload>\r\n<sys_script>\r\n<sys_id>4</sys_id>\r\n"
+            b"<script>linha 1\r\nlinha 2\rlinha 3\r\n</script>\r\n</sys_script>\r\n</unload>\r\n",
+    "nbsp": "<unload><sys_script><sys_id>5</sys_id><script>\u00a0código\u00a0</script>"
+            "<template> \u2003x\u3000</template></sys_script></unload>".encode("utf-8"),
+    "child_element": b"<unload><sys_script><sys_id>6</sys_id>"
+                     b"<script>texto<b>filho</b>resto</script><template><!-- c -->x</template></sys_script></unload>",
+    "bom": b"\xef\xbb\xbf<?xml version='1.0' encoding='UTF-8'?><unload><sys_script>"
+           b"<sys_id>7</sys_id><sys_class_name>sys_script_include</sys_class_name><script>x</script></sys_script></unload>",
+    "comments_pi": b"<?xml version='1.0'?><!-- <sys_script> --><unload><?pi <x>?><sys_script>"
+                   b"<sys_id>8</sys_id><sys_name>n</sys_name><script/><condition></condition></sys_script></unload>",
+    "attributes": b"<unload a='>'><sys_script action=\"INSERT_OR_UPDATE\" b='/>'><sys_id>9</sys_id>"
+                  b"<name display_value=\"x\">y</name><nested><sys_id>ignorado</sys_id></nested></sys_script></unload>",
+    "duplicate_key": b"<unload><sys_script><sys_id>10</sys_id><script>a</script></sys_script>"
+                     b"<sys_script><sys_id>10</sys_id><script>b</script></sys_script></unload>",
+    "missing_id": b"<unload><sys_script><script>sem id</script></sys_script><x><sys_id> 11 </sys_id></x></unload>",
+    "latin1": "<?xml version='1.0' encoding='ISO-8859-1'?><unload><sys_script><sys_id>12</sys_id>"
+              "<script>ação</script></sys_script></unload>".encode("latin-1"),
+}
+
+
+def check_equivalence(path):
+    # Diferenças entre iter_mapped_custom_records e o iterparse em chaves, campos, nome, classe e digests
+    from ingest import iter_mapped_custom_records
+    from utils import iter_custom_records, record_digests
+
+    expected = list(iter_custom_records(path))
+    mapped = list(iter_mapped_custom_records(path))
+    if [key for key, _ in mapped] != [key for key, _ in expected]:
+        return [f"chaves diferentes: {len(mapped)} x {len(expected)}"]
+    problems = []
+    for (key, record), (_, reference) in zip(mapped, expected):
+        for attribute in ("fields", "name", "class_name"):
+            if getattr(record, attribute) != getattr(reference, attribute):
+                problems.append(f"{key}: {attribute} diferente")
+        digests, digest = record_digests(reference.values)
+        if (record.digests, record.digest) != (digests, digest):
+            problems.append(f"{key}: digests diferentes")
+    return problems
+
+
+def check_all(paths, tmp):
+    edge_dir = os.path.join(tmp, "edge_cases")
+    os.makedirs(edge_dir, exist_ok=True)
+    cases = dict(paths)
+    for name, content in EDGE_CASES.items():
+        cases[name] = os.path.join(edge_dir, f"{name}.xml")
+        with open(cases[name], "wb") as f:
+            f.write(content)
+    failed = False
+    for name, path in cases.items():
+        problems = check_equivalence(path)
+        if problems:
+            failed = True
+            print(f"⚠️ mmap diverge do iterparse em {name}: {'; '.join(problems[:5])}")
+    if not failed:
+        print(f"equivalence: {len(cases)} documents match iterparse")
+    return not failed
+
+
+def run_mode(mode, path, spool_dir):
+    import perf
+    from ingest import iter_mapped_custom_records, spool_upload
+    from utils import iter_custom_records
+
+    with open(path, "rb") as f:
+        upload = io.BytesIO(f.read())
+
+    def extract():
+        upload.seek(0)
+        if mode == "upload":
+            return dict(iter_custom_records(upload))
+        return dict(iter_mapped_custom_records(spool_upload(upload, spool_dir)))
+
+    # Tempo numa passada sem tracemalloc (que pesa mais no código Python) e heap numa segunda
+    started = time.perf_counter()
+    records = extract()
+    elapsed = time.perf_counter() - started
+    del records
+    tracemalloc.start()
+    records = extract()
+    heap, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # Lê os campos de todos os registros, como numa exportação completa
+    started = time.perf_counter()
+    for record in records.values():
+        record.fields
+    fields_elapsed = time.perf_counter() - started
+    return {
+        "records": len(records), "extract_s": elapsed, "fields_s": fields_elapsed,
+        "heap_bytes": heap, "peak_rss_bytes": perf.peak_rss_bytes(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingestão do custom: upload em memória x spool + mmap")
+    parser.add_argument("custom", nargs="?", help="XML customizado (padrão: gera um sintético)")
+    parser.add_argument("--records", type=int, default=20000)
+    parser.add_argument("--script-lines", type=int, nargs=2, default=[20, 200])
+    parser.add_argument("--mode", choices=["upload", "mmap"], help=argparse.SUPPRESS)
+    parser.add_argument("--spool-dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.custom, args.spool_dir)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.custom
+        if path is None:
+            from synthetic import generate_pair
+
+            _, path, _ = generate_pair(tmp, args.records, tuple(args.script_lines))
+        if not check_all({"custom.xml": os.path.join(ROOT, "custom.xml"), "benchmark": path}, tmp):
+            sys.exit(1)
+        size = os.path.getsize(path)
+        print(f"file={path} size={size / 1024 / 1024:.1f} MB")
+        print(f"{'mode':>8} {'records':>8} {'extract s':>10} {'fields s':>9} {'heap MB':>8} {'peak RSS MB':>12}")
+        for mode in ("upload", "mmap"):
+            output = subprocess.run(
+                [sys.executable, __file__, path, "--mode", mode, "--spool-dir", os.path.join(tmp, "spool")],
+                check=True, capture_output=True, text=True,
+            ).stdout
+            result = json.loads(output)
+            print(
+                f"{mode:>8} {result['records']:>8} {result['extract_s']:>10.2f} {result['fields_s']:>9.2f} "
+                f"{result['heap_bytes'] / 1024 / 1024:>8.1f} {result['peak_rss_bytes'] / 1024 / 1024:>12.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# Benchmark: memória por registro no modelo antigo (dicts aninhados) x utils.Record
+#
+# Uso: python benchmarks/bench_records.py [--records 100000] [--script-bytes 512]
+#
+# O modelo antigo é reproduzido aqui (dict de campos + dict de digests hex por registro, e a
+# cópia {**record, "key": key} do group_by_class antigo). Cada registro tem texto próprio,
+# como sai do parser. "index (lazy)" são registros lidos do índice base, sem o texto dos campos.
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from utils import FIELDS_TO_COMPARE, Record, field_digest, group_by_class, record_digests
+
+
+def make_values(count, script_bytes):
+    line = "var gr = new GlideRecord('incident'); gr.addQuery('active', true); gr.query();\n"
+    script = (line * (script_bytes // len(line) + 1))[:script_bytes]
+    for i in range(count):
+        yield f"sys_script_{i:032x}", f"Rule {i}", "sys_script", (
+            f"active=true^number={i}", "", "true", f"// {i}\n{script}", "", "before", str(100 + i % 7)
+        )
+
+
+def legacy_records(count, script_bytes):
+    records = {}
+    for key, name, class_name, values in make_values(count, script_bytes):
+        fields = dict(zip(FIELDS_TO_COMPARE, values))
+        digests = {field: field_digest(fields[field]) for field in FIELDS_TO_COMPARE}
+        _, digest = record_digests(values)
+        records[key] = {"name": name, "fields": fields, "class": class_name, "digests": digests, "digest": digest}
+    return records
+
+
+def legacy_group_by_class(records):
+    grouped = {}
+    for key, record in records.items():
+        grouped.setdefault(record["class"], []).append({**record, "key": key})
+    return grouped
+
+
+def compact_records(count, script_bytes):
+    return {key: Record(key, name, class_name, values) for key, name, class_name, values in make_values(count, script_bytes)}
+
+
+def index_records(count, script_bytes, tmp):
+    from base_cache import read_index, write_index
+
+    db_path = os.path.join(tmp, "index.sqlite")
+    write_index(db_path, {"source_hash": "bench", "records": compact_records(count, script_bytes)})
+    gc.collect()
+    return lambda: read_index(db_path)["records"]
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memória por registro: dicts aninhados x Record")
+    parser.add_argument("--records", type=int, default=100000)
+    parser.add_argument("--script-bytes", type=int, default=512)
+    args = parser.parse_args()
+    count = args.records
+
+    print(f"records={count} script={args.script_bytes}B")
+    print(f"{'model':>28} {'total MB':>9} {'bytes/record':>13}")
+
+    def report(label, total):
+        print(f"{label:>28} {total / 1024 / 1024:>9.1f} {total / count:>13.0f}")
+
+    legacy_size, legacy = measure(lambda: legacy_records(count, args.script_bytes))
+    report("dict", legacy_size)
+    grouped_size, grouped = measure(lambda: legacy_group_by_class(legacy))
+    report("dict + group_by_class", legacy_size + grouped_size)
+    del legacy, grouped
+
+    compact_size, compact = measure(lambda: compact_records(count, args.script_bytes))
+    report("Record", compact_size)
+    grouped_size, grouped = measure(lambda: group_by_class(compact))
+    report("Record + group_by_class", compact_size + grouped_size)
+    del compact, grouped
+
+    with tempfile.TemporaryDirectory() as tmp:
+        load = index_records(count, args.script_bytes, tmp)
+        lazy_size, lazy = measure(load)
+        report("Record, index (lazy)", lazy_size)
+        del lazy
+
+
+if __name__ == "__main__":
+    main()
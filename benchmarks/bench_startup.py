@@ -0,0 +1,121 @@
+# Benchmark: tempo de import de cada módulo e de início de uma comparação headless
+#
+# Uso: python benchmarks/bench_startup.py [--repeat 3] [--records 500]
+#
+# Cada medida roda num processo Python novo e vale o menor tempo das repetições. Os módulos têm
+# limite de tempo de import (IMPORT_BUDGETS) e não podem carregar nenhum de HEAVY_MODULES, que
+# ficam para o primeiro uso (ver warmup.py); streamlit só é aceito nos módulos da interface.
+# "headless comparison" é o processo inteiro (interpretador, imports, índice base já em cache e
+# comparação de um custom sintético) e tem limite COMPARISON_BUDGET_S. Sai com 1 se algo estourar.
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+CORE_BUDGET_S = 0.3
+UI_BUDGET_S = 1.0
+IMPORT_BUDGETS = {
+    "utils": CORE_BUDGET_S, "compare": CORE_BUDGET_S, "base_cache": CORE_BUDGET_S, "ingest": CORE_BUDGET_S,
+    "search_index": CORE_BUDGET_S, "manifest": CORE_BUDGET_S, "diff_model": CORE_BUDGET_S,
+    "drift": CORE_BUDGET_S, "batch": CORE_BUDGET_S, "ai_summary": CORE_BUDGET_S,
+    "summary_scheduler": CORE_BUDGET_S, "warmup": CORE_BUDGET_S, "comparador_xml": CORE_BUDGET_S,
+    "export": UI_BUDGET_S, "logic": UI_BUDGET_S, "ui": UI_BUDGET_S,
+}
+UI_MODULES = {"export", "logic", "ui"}
+HEAVY_MODULES = ["langchain", "langchain_ollama", "langchain_core", "transformers", "torch", "pandas", "docx", "xhtml2pdf", "pypdf"]
+COMPARISON_BUDGET_S = 0.5
+
+IMPORT_CHILD = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+started = time.perf_counter()
+import {module}
+print(json.dumps([time.perf_counter() - started, sorted({{name.split(".")[0] for name in sys.modules}})]))
+"""
+
+COMPARISON_CHILD = """
+import sys
+sys.path.insert(0, {root!r})
+from base_cache import load_base_index
+from compare import compare_records
+from ingest import iter_mapped_custom_records
+comparison = compare_records(load_base_index({base!r})["records"], iter_mapped_custom_records({custom!r}))
+print(sum(map(len, comparison.values())))
+"""
+
+
+def _python(code, env=None):
+    return subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True, cwd=ROOT, env=env)
+
+
+def _wall(code, env):
+    started = time.perf_counter()
+    _python(code, env)
+    return time.perf_counter() - started
+
+
+def slowest_imports(module, count=5):
+    # Maiores tempos próprios segundo python -X importtime, para achar o culpado de um estouro
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True, cwd=ROOT)
+    rows = []
+    for line in result.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[0].strip().split(":")[-1].strip().isdigit():
+            rows.append((int(parts[0].split(":")[-1]), parts[2].strip()))
+    return sorted(rows, reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tempo de import e de início da comparação headless")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--records", type=int, default=500, help="registros do par sintético da comparação")
+    args = parser.parse_args()
+    failures = []
+
+    print(f"{'module':>18} {'import s':>9} {'budget s':>9}  heavy modules loaded")
+    for module, budget in IMPORT_BUDGETS.items():
+        code = IMPORT_CHILD.format(root=ROOT, module=module)
+        try:
+            runs = [json.loads(_python(code).stdout) for _ in range(args.repeat)]
+        except subprocess.CalledProcessError as e:
+            print(f"{module:>18} import failed: {e.stderr.strip().splitlines()[-1]} ⚠️")
+            failures.append(module)
+            continue
+        elapsed = min(run[0] for run in runs)
+        forbidden = HEAVY_MODULES if module in UI_MODULES else HEAVY_MODULES + ["streamlit"]
+        heavy = [name for name in forbidden if name in runs[0][1]]
+        flag = " ⚠️" if elapsed > budget or heavy else ""
+        print(f"{module:>18} {elapsed:>9.3f} {budget:>9.2f}  {', '.join(heavy) or '-'}{flag}")
+        if flag:
+            failures.append(module)
+            for self_us, name in slowest_imports(module):
+                print(f"{'':>20}{self_us / 1e6:.3f}s {name}")
+
+    from synthetic import generate_pair
+
+    with tempfile.TemporaryDirectory() as tmp:
+        base_path, custom_path, _ = generate_pair(tmp, args.records)
+        env = {**os.environ, "BASE_CACHE_DIR": os.path.join(tmp, "base_index")}
+        code = COMPARISON_CHILD.format(root=ROOT, base=base_path, custom=custom_path)
+        # A primeira execução monta o índice base; as seguintes medem o início com o cache pronto
+        _python(code, env)
+        elapsed = min(_wall(code, env) for _ in range(args.repeat))
+    flag = " ⚠️" if elapsed > COMPARISON_BUDGET_S else ""
+    print(f"headless comparison ({args.records} records): {elapsed:.3f}s (budget {COMPARISON_BUDGET_S:.2f}s){flag}")
+    if flag:
+        failures.append("headless comparison")
+
+    if failures:
+        print(f"⚠️ Over budget: {', '.join(failures)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
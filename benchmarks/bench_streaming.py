@@ -0,0 +1,82 @@
+# Benchmark: extração com etree.parse (árvore inteira) x iterparse em streaming
+#
+# Uso: python benchmarks/bench_streaming.py [--copies 20 80 320]
+#
+# Cada medição roda em um subprocesso separado para que o pico de RSS (ru_maxrss)
+# reflita apenas o caminho medido; tracemalloc não enxerga as alocações do libxml2.
+import argparse
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SAMPLE = os.path.join(ROOT, "custom.xml")
+
+
+def inflate(copies, dest):
+    # Repete os registros do custom.xml com name/sys_id únicos para simular um update set grande
+    with open(SAMPLE, encoding="utf-8") as f:
+        text = f.read()
+    start = text.index(">", text.index("<unload")) + 1
+    end = text.rindex("</unload>")
+    head, body, tail = text[:start], text[start:end], text[end:]
+    with open(dest, "w", encoding="utf-8") as out:
+        out.write(head)
+        for i in range(copies):
+            out.write(re.sub(r"</(name|sys_id)>", lambda m: f"_{i}</{m.group(1)}>", body))
+        out.write(tail)
+
+
+def measure(mode, path):
+    from lxml import etree
+    import resource
+    from utils import extract_base_records, extract_custom_records, iter_base_records, iter_custom_records
+
+    started = time.perf_counter()
+    # Base e custom são arquivos distintos no app, então cada caminho faz duas leituras
+    if mode == "tree":
+        base = extract_base_records(etree.parse(path))
+        custom = extract_custom_records(etree.parse(path))
+    else:
+        base = dict(iter_base_records(path))
+        custom = dict(iter_custom_records(path))
+    elapsed = time.perf_counter() - started
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"{elapsed:.3f} {peak_kb} {len(base)} {len(custom)}")
+
+
+def run(mode, path):
+    output = subprocess.check_output([sys.executable, __file__, "--measure", mode, path], text=True)
+    elapsed, peak_kb, base_count, custom_count = output.split()
+    return float(elapsed), int(peak_kb), int(base_count), int(custom_count)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara etree.parse com iterparse em streaming")
+    parser.add_argument("--copies", type=int, nargs="+", default=[20, 80, 320])
+    parser.add_argument("--measure", nargs=2, metavar=("MODE", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        measure(*args.measure)
+        return
+
+    print(f"{'copies':>7} {'size MB':>8} {'mode':>7} {'time s':>8} {'peak RSS MB':>12} {'base':>7} {'custom':>7}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for copies in args.copies:
+            path = os.path.join(tmp, f"inflated_{copies}.xml")
+            inflate(copies, path)
+            size_mb = os.path.getsize(path) / 1024 / 1024
+            for mode in ("tree", "stream"):
+                elapsed, peak_kb, base_count, custom_count = run(mode, path)
+                print(f"{copies:>7} {size_mb:>8.1f} {mode:>7} {elapsed:>8.3f} {peak_kb / 1024:>12.1f} {base_count:>7} {custom_count:>7}")
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+# Benchmark: agendador de resumos com um LLM local simulado (EchoLLM) e latência fixa por chamada
+#
+# Uso: python benchmarks/bench_summaries.py [--items 200] [--delay 0.05] [--workers 1 4 8] [--batch 1 4]
+import argparse
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from ai_summary import EchoLLM, set_llm, set_summary_cache
+from summary_scheduler import SchedulerStats, summarize_many
+
+
+def make_items(count):
+    before = "var gr = new GlideRecord('incident');\ngr.query();\n"
+    return [
+        (i, f"Rule {i}", {"script": {"before": before, "after": before + f"gs.info('{i}');\n"}})
+        for i in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mede vazão e latência do agendador de resumos")
+    parser.add_argument("--items", type=int, default=200)
+    parser.add_argument("--delay", type=float, default=0.05, help="latência simulada por chamada (s)")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--batch", type=int, nargs="+", default=[1, 4])
+    args = parser.parse_args()
+
+    items = make_items(args.items)
+    # Sem cache de resumos: todas as configurações precisam chamar o modelo
+    set_summary_cache(None)
+    print(f"{'workers':>7} {'batch':>5} {'calls':>6} {'time s':>7} {'items/s':>8} {'p50 s':>6} {'p90 s':>6} {'p99 s':>6}")
+    for workers in args.workers:
+        for batch in args.batch:
+            set_llm(EchoLLM(delay=args.delay))
+            stats = SchedulerStats()
+            summaries = dict(summarize_many(items, max_workers=workers, batch_size=batch, stats=stats))
+            assert len(summaries) == len(items)
+            r = stats.report()
+            print(f"{workers:>7} {batch:>5} {r['llm_calls']:>6} {r['elapsed_s']:>7.2f} {r['throughput_per_s']:>8.1f} "
+                  f"{r['p50_s']:>6.3f} {r['p90_s']:>6.3f} {r['p99_s']:>6.3f}")
+
+
+if __name__ == "__main__":
+    main()
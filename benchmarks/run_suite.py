@@ -0,0 +1,166 @@
+# Suíte de benchmarks sobre pares sintéticos (benchmarks/synthetic.py), com resultados salvos
+#
+# Uso: python benchmarks/run_suite.py [--records 1000] [--repeat 3] [--stages ...] [--label nome]
+#                                     [--baseline .cache/benchmarks/outro.json] [--tolerance 0.15]
+#
+# Mede extract_base_records, extract_custom_records, os extractors em streaming, compare_records,
+# o cálculo dos diffs dos modificados e cada exportador (write_csv/html/docx/pdf). Cada etapa roda
+# --repeat vezes e o JSON guarda todas as execuções, o mínimo e a mediana. Com --baseline, as
+# etapas mais lentas que o mínimo da referência além da tolerância são marcadas e o processo sai com 1.
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from lxml import etree
+from synthetic import generate_pair
+from utils import extract_base_records, extract_custom_records, iter_base_records, iter_custom_records
+from compare import compare_records
+from diff_model import compute_record_diff
+
+RESULTS_DIR = os.path.join(ROOT, ".cache", "benchmarks")
+EXPORT_STAGES = ["write_csv", "write_html", "write_docx", "write_pdf"]
+STAGES = [
+    "extract_base_records", "extract_custom_records", "iter_base_records", "iter_custom_records",
+    "compare_records", "compute_record_diff",
+] + EXPORT_STAGES
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def timed(func, repeat):
+    runs = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        runs.append(time.perf_counter() - started)
+    return {"runs": runs, "min_s": min(runs), "median_s": statistics.median(runs)}, result
+
+
+def run_suite(records, repeat, stages, script_lines, change_ratio, new_ratio, seed, tmp):
+    from export import EXPORT_FORMATS, warm_up
+    from logic import iter_results
+
+    # Os exportadores importam xhtml2pdf/python-docx no primeiro uso; fora da medida das etapas
+    warm_up()
+
+    base_path, custom_path, expected = generate_pair(tmp, records, script_lines, change_ratio, new_ratio, seed)
+    results = {}
+    base = extract_base_records(etree.parse(base_path))
+    custom = extract_custom_records(etree.parse(custom_path))
+    comparison = compare_records(base, custom)
+    diffs = {key: compute_record_diff(record.differences) for key, record in comparison["modified"].items()}
+
+    steps = {
+        "extract_base_records": lambda: extract_base_records(etree.parse(base_path)),
+        "extract_custom_records": lambda: extract_custom_records(etree.parse(custom_path)),
+        "iter_base_records": lambda: dict(iter_base_records(base_path)),
+        "iter_custom_records": lambda: dict(iter_custom_records(custom_path)),
+        "compare_records": lambda: compare_records(base, custom),
+        "compute_record_diff": lambda: [compute_record_diff(record.differences) for record in comparison["modified"].values()],
+    }
+    # Os exportadores recebem os resultados já montados, então só a escrita entra na medição
+    export_rows = list(iter_results(comparison, {}, diffs))
+    for stage in EXPORT_STAGES:
+        fmt = stage.split("_", 1)[1]
+        writer = EXPORT_FORMATS[fmt][3]
+        path = os.path.join(tmp, f"export.{fmt}")
+        steps[stage] = lambda writer=writer, path=path: writer(iter(export_rows), path)
+
+    for stage in stages:
+        results[stage], _ = timed(steps[stage], repeat)
+        print(f"{stage:>24} {results[stage]['min_s']:>9.3f} {results[stage]['median_s']:>9.3f}")
+
+    return {
+        "files": {
+            "base_mb": os.path.getsize(base_path) / 1024 / 1024,
+            "custom_mb": os.path.getsize(custom_path) / 1024 / 1024,
+        },
+        "expected": expected,
+        "counts": {status: len(records) for status, records in comparison.items()},
+        "stages": results,
+    }
+
+
+def compare_with_baseline(current, baseline, tolerance):
+    regressions = []
+    print(f"\n{'stage':>24} {'baseline s':>11} {'current s':>10} {'ratio':>7}")
+    for stage, result in current["stages"].items():
+        reference = baseline.get("stages", {}).get(stage)
+        if reference is None:
+            continue
+        ratio = result["min_s"] / reference["min_s"] if reference["min_s"] else float("inf")
+        flag = " ⚠️ regression" if ratio > 1 + tolerance else ""
+        if flag:
+            regressions.append(stage)
+        print(f"{stage:>24} {reference['min_s']:>11.3f} {result['min_s']:>10.3f} {ratio:>6.2f}x{flag}")
+    if baseline.get("params") != current["params"]:
+        print("⚠️ Parâmetros diferentes da referência; a comparação é só indicativa")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Suíte de benchmarks sobre pares base/custom sintéticos")
+    parser.add_argument("--records", type=int, default=1000)
+    parser.add_argument("--script-lines", type=int, nargs=2, default=[20, 200], metavar=("MIN", "MAX"))
+    parser.add_argument("--change-ratio", type=float, default=0.1)
+    parser.add_argument("--new-ratio", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    parser.add_argument("--label", default=None, help="nome do arquivo de resultados (padrão: revisão do git)")
+    parser.add_argument("--out-dir", default=RESULTS_DIR)
+    parser.add_argument("--baseline", default=None, help="JSON de uma execução anterior para comparar")
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    args = parser.parse_args()
+
+    revision = _git_revision()
+    label = args.label or revision or time.strftime("%Y%m%d-%H%M%S")
+    params = {
+        "records": args.records, "script_lines": args.script_lines, "change_ratio": args.change_ratio,
+        "new_ratio": args.new_ratio, "seed": args.seed, "repeat": args.repeat,
+    }
+    print(f"{'stage':>24} {'min s':>9} {'median s':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        report = run_suite(
+            args.records, args.repeat, args.stages, tuple(args.script_lines),
+            args.change_ratio, args.new_ratio, args.seed, tmp,
+        )
+    report.update({
+        "label": label,
+        "git_revision": revision,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": {"platform": platform.platform(), "cpus": os.cpu_count()},
+        "params": params,
+    })
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    out_path = os.path.join(args.out_dir, f"{label}.json")
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nresultados: {out_path}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare_with_baseline(report, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+# Gerador de pares base/custom sintéticos, no formato dos XMLs do app
+#
+# Uso: python benchmarks/synthetic.py OUT_DIR [--records 1000] [--script-lines 20 200]
+#                                             [--change-ratio 0.1] [--new-ratio 0.05] [--seed 42]
+#
+# A base segue o custom.xml: <unload> com um sys_remote_update_set e uma linha
+# sys_update_xml por registro, com o registro serializado (e escapado) no <payload>.
+# O custom é o export de registros lido por extract_custom_records: um elemento por
+# registro, filho direto de <unload>, com sys_id e sys_class_name. As chaves batem
+# (<classe>_<sys_id>), então a comparação encontra modificados, iguais e novos.
+import argparse
+import os
+import random
+from xml.sax.saxutils import escape
+
+FIELDS = ["filter_condition", "condition", "active", "script", "template", "when", "order"]
+CLASSES = ["sys_script", "sys_script_include", "sys_ui_action", "sys_ui_policy", "sys_data_policy", "sys_script_fix"]
+
+SCRIPT_LINES = [
+    "var gr = new GlideRecord('{table}');",
+    "gr.addQuery('active', true);",
+    "gr.addEncodedQuery('{query}');",
+    "gr.query();",
+    "while (gr.next()) {{",
+    "\tgs.debug('{name}: ' + gr.getUniqueValue());",
+    "\tgr.setValue('{field}', current.getValue('{field}'));",
+    "\tgr.update();",
+    "}}",
+    "if (current.{field}.changes()) {{",
+    "\tcurrent.setAbortAction(false);",
+    "}}",
+    "var result = new x_pd_integration.PagerDuty_REST().getIncident(current.sys_id);",
+    "gs.info('{name} finished for ' + current.number);",
+]
+TABLES = ["incident", "problem", "change_request", "sys_user", "sc_task", "x_pd_integration_pagerduty_webhook"]
+FIELD_NAMES = ["assigned_to", "state", "priority", "short_description", "u_on_behalf_of", "assignment_group"]
+
+
+def _sys_id(rng):
+    return f"{rng.getrandbits(128):032x}"
+
+
+def _script(rng, name, lines):
+    return "\n".join(
+        rng.choice(SCRIPT_LINES).format(
+            table=rng.choice(TABLES), field=rng.choice(FIELD_NAMES), name=name,
+            query=f"priority={rng.randint(1, 5)}^state!=7",
+        )
+        for _ in range(lines)
+    )
+
+
+def make_record(rng, number, script_lines):
+    class_name = rng.choice(CLASSES)
+    name = f"PD {class_name.replace('sys_', '').replace('_', ' ').title()} {number}"
+    fields = {
+        "filter_condition": f"active=true^priority<={rng.randint(1, 5)}^EQ" if rng.random() < 0.6 else "",
+        "condition": f"current.{rng.choice(FIELD_NAMES)}.changes()" if rng.random() < 0.5 else "",
+        "active": rng.choice(["true", "true", "true", "false"]),
+        "script": _script(rng, name, rng.randint(*script_lines)),
+        "template": f"{rng.choice(FIELD_NAMES)}=javascript:gs.getUserID()^EQ" if class_name == "sys_ui_action" else "",
+        "when": rng.choice(["before", "after", "async", "display"]) if class_name == "sys_script" else "",
+        "order": str(rng.choice([100, 100, 200, 500, 1000])),
+    }
+    return {"class": class_name, "sys_id": _sys_id(rng), "name": name, "fields": fields}
+
+
+def modify(rng, record):
+    # Mudanças parecidas com customizações reais: linhas trocadas/inseridas no script e ajustes pontuais
+    fields = dict(record["fields"])
+    lines = fields["script"].split("\n")
+    for _ in range(rng.randint(1, 3)):
+        position = rng.randrange(len(lines) + 1)
+        choice = rng.random()
+        if choice < 0.5:
+            lines.insert(position, f"// customized: {rng.choice(FIELD_NAMES)} handling")
+        elif choice < 0.8 and position < len(lines):
+            lines[position] = _script(rng, record["name"], 1)
+        elif position < len(lines) and len(lines) > 1:
+            del lines[position]
+    fields["script"] = "\n".join(lines)
+    if rng.random() < 0.3:
+        fields["order"] = str(int(fields["order"] or 100) + 10)
+    if rng.random() < 0.2:
+        fields["condition"] = f"{fields['condition']} && gs.hasRole('admin')".strip(" &")
+    return {**record, "fields": fields}
+
+
+def _field_xml(field, value):
+    if not value:
+        return f"<{field}/>"
+    if field == "script":
+        return f"<{field}><![CDATA[{value}]]></{field}>"
+    return f"<{field}>{escape(value)}</{field}>"
+
+
+def _record_xml(record):
+    body = "".join(_field_xml(field, record["fields"][field]) for field in FIELDS)
+    return (
+        f'<{record["class"]} action="INSERT_OR_UPDATE">{body}<name>{escape(record["name"])}</name>'
+        f'<sys_class_name>{record["class"]}</sys_class_name><sys_id>{record["sys_id"]}</sys_id></{record["class"]}>'
+    )
+
+
+def write_base(path, records, rng):
+    update_set_id = _sys_id(rng)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("<?xml version='1.0' encoding='utf-8'?>\n<unload unload_date=\"2025-03-31 04:08:31\">\n")
+        f.write(
+            '<sys_remote_update_set action="INSERT_OR_UPDATE">\n<name>synthetic base</name>\n<state>loaded</state>\n'
+            f"<sys_class_name>sys_remote_update_set</sys_class_name>\n<sys_id>{update_set_id}</sys_id>\n</sys_remote_update_set>\n"
+        )
+        for record in records:
+            payload = (
+                f'<?xml version="1.0" encoding="UTF-8"?><record_update table="{record["class"]}">'
+                f"{_record_xml(record)}</record_update>"
+            )
+            f.write(
+                '<sys_update_xml action="INSERT_OR_UPDATE">\n<action>INSERT_OR_UPDATE</action>\n<category>customer</category>\n'
+                f'<name>{record["class"]}_{record["sys_id"]}</name>\n<payload>{escape(payload)}</payload>\n'
+                f'<remote_update_set display_value="synthetic base">{update_set_id}</remote_update_set>\n'
+                f"<sys_id>{_sys_id(rng)}</sys_id>\n<target_name>{escape(record['name'])}</target_name>\n</sys_update_xml>\n"
+            )
+        f.write("</unload>\n")
+
+
+def write_custom(path, records):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("<?xml version='1.0' encoding='utf-8'?>\n<unload unload_date=\"2025-03-31 04:08:31\">\n")
+        for record in records:
+            f.write(_record_xml(record) + "\n")
+        f.write("</unload>\n")
+
+
+def generate_pair(out_dir, records=1000, script_lines=(20, 200), change_ratio=0.1, new_ratio=0.05, seed=42):
+    # Retorna (base_path, custom_path, contagens esperadas)
+    rng = random.Random(seed)
+    base = [make_record(rng, number, script_lines) for number in range(records)]
+    custom = []
+    modified = 0
+    for record in base:
+        if rng.random() < change_ratio:
+            custom.append(modify(rng, record))
+            modified += 1
+        else:
+            custom.append(record)
+    new = int(records * new_ratio)
+    custom.extend(make_record(rng, records + number, script_lines) for number in range(new))
+    rng.shuffle(custom)
+
+    os.makedirs(out_dir, exist_ok=True)
+    base_path = os.path.join(out_dir, f"base_{records}.xml")
+    custom_path = os.path.join(out_dir, f"custom_{records}.xml")
+    write_base(base_path, base, rng)
+    write_custom(custom_path, custom)
+    return base_path, custom_path, {"base": records, "new": new, "modified": modified, "unchanged": records - modified}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera um par base/custom sintético")
+    parser.add_argument("out_dir")
+    parser.add_argument("--records", type=int, default=1000)
+    parser.add_argument("--script-lines", type=int, nargs=2, default=[20, 200], metavar=("MIN", "MAX"))
+    parser.add_argument("--change-ratio", type=float, default=0.1)
+    parser.add_argument("--new-ratio", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    base_path, custom_path, counts = generate_pair(
+        args.out_dir, args.records, tuple(args.script_lines), args.change_ratio, args.new_ratio, args.seed
+    )
+    print(f"base: {base_path} ({os.path.getsize(base_path) / 1024 / 1024:.1f} MB)")
+    print(f"custom: {custom_path} ({os.path.getsize(custom_path) / 1024 / 1024:.1f} MB)")
+    print(f"expected: {counts}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,26 @@
 from lxml import etree
 import difflib
-from transformers import pipeline
+import mmap
+import os
 
-# Carrega o modelo de resumo
-resumidor = pipeline("summarization")
+# O pipeline do transformers (que importa o torch) só é criado no primeiro resumo
+resumidor = None
 
-def carregar_arquivo_xml(caminho):
-    with open(caminho, 'r', encoding='utf-8') as f:
-        return f.read()
+def carregar_resumidor():
+    global resumidor
+    if resumidor is None:
+        from transformers import pipeline
+        resumidor = pipeline("summarization")
+    return resumidor
 
-def comparar_xml(texto1, texto2):
-    linhas1 = texto1.splitlines()
-    linhas2 = texto2.splitlines()
+def carregar_linhas_xml(caminho):
+    # Linhas lidas do arquivo mapeado, sem montar antes uma string com o arquivo inteiro
+    if os.path.getsize(caminho) == 0:
+        return []
+    with open(caminho, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+        return [linha.decode('utf-8').rstrip('\r\n') for linha in iter(m.readline, b'')]
+
+def comparar_xml(linhas1, linhas2):
     diff = difflib.unified_diff(linhas1, linhas2, fromfile='pagerduty-v8.1.0-dev.xml', tofile='custom.xml', lineterm='')
     return '\n'.join(diff)
 
@@ -23,12 +32,12 @@ def resumir_diferencas(diferencas):
     if len(diferencas) > 1000:
         diferencas = diferencas[:1000]
     
-    resumo = resumidor(diferencas, max_length=80, min_length=25, do_sample=False)
+    resumo = carregar_resumidor()(diferencas, max_length=80, min_length=25, do_sample=False)
     return resumo[0]['summary_text']
 
 if __name__ == "__main__":
-    xml_base = carregar_arquivo_xml('pagerduty-v8.1.0-dev.xml')
-    xml_custom = carregar_arquivo_xml('custom.xml')
+    xml_base = carregar_linhas_xml('pagerduty-v8.1.0-dev.xml')
+    xml_custom = carregar_linhas_xml('custom.xml')
 
     print("🔍 Comparando os arquivos...")
     diferencas = comparar_xml(xml_base, xml_custom)
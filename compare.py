@@ -0,0 +1,76 @@
+# Motor de comparação independente da interface (sem Streamlit)
+#
+# Os registros já chegam com digests por campo e por registro (utils.Record).
+# Registros iguais saem com uma única comparação de digest; o texto só é lido para
+# os campos cujo digest difere.
+import perf
+
+
+class ComparedRecord:
+    # Estado de uma comparação (diferenças, reaproveitamento, resumo) separado do Record, que é
+    # compartilhado entre versões base no batch e fica no LRU do índice base
+    __slots__ = ("record", "differences", "recomputed", "summary")
+
+    def __init__(self, record, differences=None):
+        self.record = record
+        self.differences = differences
+        self.recomputed = True
+        self.summary = None
+
+    @property
+    def key(self):
+        return self.record.key
+
+    @property
+    def name(self):
+        return self.record.name
+
+    @property
+    def class_name(self):
+        return self.record.class_name
+
+    @property
+    def digest(self):
+        return self.record.digest
+
+    @property
+    def fields(self):
+        return self.record.fields
+
+
+def diff_fields(base_record, custom_record):
+    changed = custom_record.changed_fields(base_record)
+    if not changed:
+        return {}
+    base_fields = base_record.fields
+    custom_fields = custom_record.fields
+    return {field: {"before": base_fields[field], "after": custom_fields[field]} for field in changed}
+
+
+@perf.timed("compare")
+def compare_records(base_records, custom_records):
+    # custom_records pode ser um dict ou um iterável de (key, record), como iter_custom_records
+    items = custom_records.items() if isinstance(custom_records, dict) else custom_records
+
+    new_records = {}
+    modified_records = {}
+    unchanged_records = {}
+
+    for key, record in items:
+        # Mantém a semântica de dict do extractor: a última ocorrência de uma chave prevalece
+        for bucket in (new_records, modified_records, unchanged_records):
+            bucket.pop(key, None)
+        base_record = base_records.get(key)
+        if base_record is None:
+            new_records[key] = ComparedRecord(record)
+            continue
+        if base_record.digest == record.digest:
+            unchanged_records[key] = ComparedRecord(record)
+            continue
+        diffs = diff_fields(base_record, record)
+        if diffs:
+            modified_records[key] = ComparedRecord(record, diffs)
+        else:
+            unchanged_records[key] = ComparedRecord(record)
+
+    return {"new": new_records, "modified": modified_records, "unchanged": unchanged_records}
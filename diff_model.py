@@ -0,0 +1,199 @@
+# Modelo de diff calculado uma única vez por registro/campo
+#
+# compute_field_diff guarda as linhas, os opcodes (mesmo formato do difflib) e os hunks com
+# contexto; a tela (render_html) e os quatro exportadores consomem esse modelo em vez de rodar
+# SequenceMatcher de novo. Scripts longos usam um diff por hash de linha (patience), que evita
+# o pior caso quadrático do SequenceMatcher.
+import difflib
+from bisect import bisect_left
+from html import escape
+import perf
+
+DEFAULT_CONTEXT = 5
+# Acima desse total de linhas o diff por hash de linha substitui o SequenceMatcher
+LINE_HASH_THRESHOLD = 2000
+# Regiões sem âncoras menores que isso (linhas_a * linhas_b) ainda passam pelo SequenceMatcher
+_FALLBACK_CELLS = 250_000
+
+
+def compute_field_diff(before, after, context=DEFAULT_CONTEXT):
+    before_lines = before.splitlines()
+    after_lines = after.splitlines()
+    if len(before_lines) + len(after_lines) > LINE_HASH_THRESHOLD:
+        opcodes = line_hash_opcodes(before_lines, after_lines)
+    else:
+        opcodes = difflib.SequenceMatcher(None, before_lines, after_lines).get_opcodes()
+    field_diff = {
+        "before_lines": before_lines,
+        "after_lines": after_lines,
+        "opcodes": opcodes,
+        "context": context,
+    }
+    field_diff["hunks"] = build_hunks(field_diff, context)
+    return field_diff
+
+
+@perf.timed("diff")
+def compute_record_diff(differences, context=DEFAULT_CONTEXT):
+    return {field: compute_field_diff(values["before"], values["after"], context) for field, values in differences.items()}
+
+
+def build_hunks(field_diff, context=DEFAULT_CONTEXT):
+    # Um hunk por opcode diferente de "equal", com as faixas de contexto antes (no before) e depois (no after)
+    hunks = []
+    after_count = len(field_diff["after_lines"])
+    for tag, i1, i2, j1, j2 in field_diff["opcodes"]:
+        if tag == "equal":
+            continue
+        hunks.append({
+            "tag": tag, "i1": i1, "i2": i2, "j1": j1, "j2": j2,
+            "context_before": (max(i1 - context, 0), i1),
+            "context_after": (j2, min(j2 + context, after_count)),
+        })
+    return hunks
+
+
+def hunks(field_diff, context=DEFAULT_CONTEXT):
+    if context == field_diff["context"]:
+        return field_diff["hunks"]
+    return build_hunks(field_diff, context)
+
+
+def line_hash_opcodes(before_lines, after_lines):
+    # Linhas viram inteiros (hash interno do dict), então as comparações são O(1) por linha
+    ids = {}
+    a = [ids.setdefault(line, len(ids)) for line in before_lines]
+    b = [ids.setdefault(line, len(ids)) for line in after_lines]
+    blocks = []
+    _patience(a, b, 0, len(a), 0, len(b), blocks)
+    blocks.append((len(a), len(b), 0))
+    return _blocks_to_opcodes(blocks)
+
+
+def _patience(a, b, alo, ahi, blo, bhi, blocks):
+    # Prefixo e sufixo comuns saem direto
+    start = 0
+    while alo + start < ahi and blo + start < bhi and a[alo + start] == b[blo + start]:
+        start += 1
+    if start:
+        blocks.append((alo, blo, start))
+        alo += start
+        blo += start
+    end = 0
+    while alo < ahi - end and blo < bhi - end and a[ahi - end - 1] == b[bhi - end - 1]:
+        end += 1
+    suffix = (ahi - end, bhi - end, end) if end else None
+    ahi -= end
+    bhi -= end
+
+    if alo < ahi and blo < bhi:
+        anchors = _unique_anchors(a, b, alo, ahi, blo, bhi)
+        if anchors:
+            prev_a, prev_b = alo, blo
+            for i, j in anchors:
+                _patience(a, b, prev_a, i, prev_b, j, blocks)
+                blocks.append((i, j, 1))
+                prev_a, prev_b = i + 1, j + 1
+            _patience(a, b, prev_a, ahi, prev_b, bhi, blocks)
+        elif (ahi - alo) * (bhi - blo) <= _FALLBACK_CELLS:
+            matcher = difflib.SequenceMatcher(None, a[alo:ahi], b[blo:bhi], autojunk=False)
+            for i, j, size in matcher.get_matching_blocks():
+                if size:
+                    blocks.append((alo + i, blo + j, size))
+        # Sem âncoras e grande demais: a região inteira vira um único "replace"
+
+    if suffix:
+        blocks.append(suffix)
+
+
+def _unique_anchors(a, b, alo, ahi, blo, bhi):
+    # Linhas que aparecem exatamente uma vez em cada lado, na maior subsequência crescente (patience sort)
+    counts = {}
+    for i in range(alo, ahi):
+        entry = counts.get(a[i])
+        counts[a[i]] = [1, i, None] if entry is None else [entry[0] + 1, i, None]
+    for j in range(blo, bhi):
+        entry = counts.get(b[j])
+        if entry is not None and entry[0] == 1:
+            entry[2] = j if entry[2] is None else -1
+    pairs = [(entry[1], entry[2]) for entry in counts.values() if entry[0] == 1 and entry[2] not in (None, -1)]
+    if not pairs:
+        return []
+    pairs.sort()
+
+    tails, tail_index, previous = [], [], [None] * len(pairs)
+    for position, (_, j) in enumerate(pairs):
+        slot = bisect_left(tails, j)
+        if slot:
+            previous[position] = tail_index[slot - 1]
+        if slot == len(tails):
+            tails.append(j)
+            tail_index.append(position)
+        else:
+            tails[slot] = j
+            tail_index[slot] = position
+    anchors = []
+    position = tail_index[-1]
+    while position is not None:
+        anchors.append(pairs[position])
+        position = previous[position]
+    anchors.reverse()
+    return anchors
+
+
+def _blocks_to_opcodes(blocks):
+    # Mesma conversão de SequenceMatcher.get_opcodes, juntando blocos adjacentes
+    merged = []
+    for i, j, size in sorted(blocks):
+        if merged and merged[-1][0] + merged[-1][2] == i and merged[-1][1] + merged[-1][2] == j and size:
+            merged[-1] = (merged[-1][0], merged[-1][1], merged[-1][2] + size)
+        else:
+            merged.append((i, j, size))
+    opcodes = []
+    i = j = 0
+    for ai, bj, size in merged:
+        tag = ""
+        if i < ai and j < bj:
+            tag = "replace"
+        elif i < ai:
+            tag = "delete"
+        elif j < bj:
+            tag = "insert"
+        if tag:
+            opcodes.append((tag, i, ai, j, bj))
+        i, j = ai + size, bj + size
+        if size:
+            opcodes.append(("equal", ai, i, bj, j))
+    return opcodes
+
+
+def render_html(field_diff, context=DEFAULT_CONTEXT):
+    # HTML com estilos inline usado no components.html da tela de resultados
+    before_lines = field_diff["before_lines"]
+    after_lines = field_diff["after_lines"]
+    parts = ["<pre style='font-family: monospace;'>"]
+    for tag, i1, i2, j1, j2 in field_diff["opcodes"]:
+        if tag == "equal":
+            if i2 - i1 <= context * 2:
+                for offset, line in enumerate(before_lines[i1:i2]):
+                    parts.append(f"<span style='color:#888;'>  {i1 + offset + 1:>4}: {escape(line)}</span><br>")
+            else:
+                parts.append("<span style='color:#aaa;'>  ...</span><br>")
+        elif tag == "replace":
+            start = max(i1 - context, 0)
+            for offset, line in enumerate(before_lines[start:i1]):
+                parts.append(f"<span style='color:#888;'>  {start + offset + 1:>4}: {escape(line)}</span><br>")
+            for offset, line in enumerate(before_lines[i1:i2]):
+                parts.append(f"<span style='background-color:#fddede;'>- {i1 + offset + 1:>4}: {escape(line)}</span><br>")
+            for offset, line in enumerate(after_lines[j1:j2]):
+                parts.append(f"<span style='background-color:#d4fcdc;'>+ {j1 + offset + 1:>4}: {escape(line)}</span><br>")
+            for offset, line in enumerate(after_lines[j2:j2+context]):
+                parts.append(f"<span style='color:#888;'>  {j2 + offset + 1:>4}: {escape(line)}</span><br>")
+        elif tag == "delete":
+            for offset, line in enumerate(before_lines[i1:i2]):
+                parts.append(f"<span style='background-color:#fddede;'>- {i1 + offset + 1:>4}: {escape(line)}</span><br>")
+        elif tag == "insert":
+            for offset, line in enumerate(after_lines[j1:j2]):
+                parts.append(f"<span style='background-color:#d4fcdc;'>+ {j1 + offset + 1:>4}: {escape(line)}</span><br>")
+    parts.append("</pre>")
+    return "".join(parts)
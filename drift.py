@@ -0,0 +1,120 @@
+# Matriz de drift: um update set customizado contra todas as versões base de uma vez
+#
+# Uso:
+#   python drift.py CUSTOM.xml [--versions v7.6 v8.1.0] [--out drift/] [--format csv jsonl]
+#
+# O custom é extraído uma única vez e cada versão vem do índice base em cache (base_cache).
+# A classificação usa só os digests por campo dos registros, sem ler o texto, então o custo
+# é linear em registros x versões. Além do status por registro e versão, conta por campo
+# quantos registros customizados diferem de cada versão e quantos mudaram na própria base
+# em relação à versão anterior (o que indica retrabalho na atualização).
+from base_cache import load_base_index
+from utils import BASE_VERSION_PATHS, FIELDS_TO_COMPARE, write_table
+from ingest import iter_mapped_custom_records
+from collections import Counter
+import argparse
+import json
+import os
+import perf
+
+STATUSES = ["new", "modified", "unchanged"]
+
+
+@perf.timed("drift")
+def drift_matrix(custom_records, base_versions):
+    # custom_records: {key: Record}; base_versions: {versão: {key: Record}}, na ordem das versões
+    versions = list(base_versions)
+    rows = []
+    totals = {version: Counter() for version in versions}
+    churn = {version: Counter() for version in versions}
+    base_churn = {version: Counter() for version in versions[1:]}
+
+    for key, record in custom_records.items():
+        row = {"key": key, "name": record.name, "class": record.class_name, "status": {}, "changed_fields": {}}
+        previous = None
+        for version in versions:
+            base_record = base_versions[version].get(key)
+            changed = record.changed_fields(base_record) if base_record is not None else []
+            if base_record is None:
+                status = "new"
+            elif changed:
+                status = "modified"
+            else:
+                status = "unchanged"
+            row["status"][version] = status
+            row["changed_fields"][version] = changed
+            totals[version][status] += 1
+            churn[version].update(changed)
+            if previous is not None and base_record is not None and previous[1] is not None:
+                base_churn[version].update(base_record.changed_fields(previous[1]))
+            previous = (version, base_record)
+        rows.append(row)
+
+    field_churn = [
+        {
+            "version": version, "field": field, "modified": churn[version][field],
+            "base_changed_since_previous": base_churn[version][field] if version in base_churn else None,
+        }
+        for version in versions for field in FIELDS_TO_COMPARE
+    ]
+    return {
+        "versions": versions,
+        "rows": rows,
+        "totals": {version: {status: totals[version][status] for status in STATUSES} for version in versions},
+        "field_churn": field_churn,
+    }
+
+
+def flat_row(row, versions):
+    # Linha achatada para CSV/tabela: uma coluna de status e uma de campos por versão
+    flat = {"key": row["key"], "name": row["name"], "class": row["class"]}
+    for version in versions:
+        flat[version] = row["status"][version]
+        flat[f"{version}_changed_fields"] = ";".join(row["changed_fields"][version])
+    return flat
+
+
+def matrix_rows(matrix):
+    for row in matrix["rows"]:
+        yield flat_row(row, matrix["versions"])
+
+
+def write_matrix(matrix, out_dir, formats):
+    os.makedirs(out_dir, exist_ok=True)
+    versions = matrix["versions"]
+    columns = ["key", "name", "class"] + [
+        column for version in versions for column in (version, f"{version}_changed_fields")
+    ]
+    write_table(matrix["rows"], os.path.join(out_dir, "drift_matrix"), formats, columns, lambda row: flat_row(row, versions))
+    if "jsonl" in formats:
+        with open(os.path.join(out_dir, "drift_summary.json"), "w", encoding="utf-8") as f:
+            json.dump({key: matrix[key] for key in ("versions", "totals", "field_churn")}, f, indent=2)
+    if "csv" in formats:
+        write_table(matrix["field_churn"], os.path.join(out_dir, "field_churn"), ["csv"],
+                    ["version", "field", "modified", "base_changed_since_previous"])
+
+
+def main(argv=None):
+    from batch import resolve_versions
+
+    parser = argparse.ArgumentParser(description="Compara um update set customizado contra todas as versões base de uma vez")
+    parser.add_argument("custom", help="XML customizado")
+    parser.add_argument("--versions", nargs="+", default=list(BASE_VERSION_PATHS),
+                        help="nomes em BASE_VERSION_PATHS ou caminhos de XMLs base (padrão: todas)")
+    parser.add_argument("--out", default="drift", help="diretório de saída")
+    parser.add_argument("--format", nargs="+", choices=["jsonl", "csv"], default=["csv"], dest="formats")
+    args = parser.parse_args(argv)
+
+    custom_records = dict(perf.timed_iter("parse_custom", iter_mapped_custom_records(args.custom)))
+    base_versions = {version: load_base_index(path)["records"] for version, path in resolve_versions(args.versions).items()}
+    matrix = drift_matrix(custom_records, base_versions)
+    write_matrix(matrix, args.out, args.formats)
+
+    print(f"{'version':>12} " + " ".join(f"{status:>10}" for status in STATUSES))
+    for version, totals in matrix["totals"].items():
+        print(f"{version:>12} " + " ".join(f"{totals[status]:>10}" for status in STATUSES))
+    print(f"📊 {len(matrix['rows'])} records x {len(matrix['versions'])} versions in {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,164 +1,238 @@
-import pandas as pd
 import streamlit as st
-from io import BytesIO, StringIO
-from docx import Document
-from docx.shared import RGBColor
-from xhtml2pdf import pisa
+from concurrent.futures import ThreadPoolExecutor
 from html import escape
-import difflib
-
-def export_csv(results):
-    df = pd.DataFrame(results)
-    csv = df[["class", "name", "type", "summary"]].to_csv(index=False).encode("utf-8")
-    st.download_button("🗕️ Download CSV", data=csv, file_name="servicenow_records.csv", mime="text/csv")
-
-def export_pdf(results, context=5):
-    html = """
-    <html><head>
-    <style>
+from diff_model import hunks
+from utils import prune_older_than
+import csv
+import os
+import tempfile
+import perf
+
+# Os relatórios são gerados só quando pedidos, numa thread de fundo, e escritos aos poucos
+# num arquivo temporário em EXPORT_DIR em vez de montar o documento inteiro em memória.
+EXPORT_DIR = os.getenv("EXPORT_DIR", os.path.join(".cache", "exports"))
+# Relatórios de sessões abandonadas ou de antes de um restart são apagados depois desse prazo
+EXPORT_MAX_AGE_S = float(os.getenv("EXPORT_MAX_AGE_HOURS", "24")) * 3600
+# Registros por lote no PDF: cada lote vira um PDF parcial e os lotes são concatenados no final
+PDF_BATCH_SIZE = int(os.getenv("PDF_BATCH_SIZE", "100"))
+
+_export_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="export")
+
+HTML_STYLE = """<style>
     body { font-family: Arial; }
     h3 { color: #333; }
-    pre { background: #f4f4f4; padding: 10px; }
     .added { background-color: #d4fcdc; }
     .removed { background-color: #fddede; }
     .context { color: #888; }
-    </style>
-    </head><body><h2>ServiceNow Record Summary</h2>
-    """
+    pre { background: #f4f4f4; padding: 10px; border-radius: 5px; }
+    </style>"""
+
+def _status_label(r):
+    # Registros reaproveitados do manifesto da execução anterior ficam marcados nos relatórios
+    return r['type'] if r.get('recomputed', True) else f"{r['type']}, reused from previous run"
+
+def _html_diff_parts(diffs, context):
+    # Corpo do <pre> usado pelo PDF e pelo HTML, a partir dos hunks do diff_model
+    for field, field_diff in diffs.items():
+        before_lines = field_diff['before_lines']
+        after_lines = field_diff['after_lines']
+        yield f"<b>Field: {escape(field)}</b>\n"
+
+        for hunk in hunks(field_diff, context):
+            yield "<span class='context'>Context Before:\n"
+            yield "\n".join(f"{idx+1:4}: {escape(before_lines[idx])}" for idx in range(*hunk['context_before']))
+            yield "\n</span><span class='removed'>"
+            yield "\n".join(f"{idx+1:4}: - {escape(before_lines[idx])}" for idx in range(hunk['i1'], hunk['i2']))
+            yield "\n</span><span class='added'>"
+            yield "\n".join(f"{idx+1:4}: + {escape(after_lines[idx])}" for idx in range(hunk['j1'], hunk['j2']))
+            yield "\n</span><span class='context'>Context After:\n"
+            yield "\n".join(f"{idx+1:4}: {escape(after_lines[idx])}" for idx in range(*hunk['context_after']))
+            yield "\n</span>" + "-"*40 + "\n"
+
+def _record_html(r, context):
+    parts = [
+        f"<h3>{escape(r['name'])} ({_status_label(r)})</h3>",
+        f"<p><strong>AI Summary:</strong> {r['summary']}</p><pre>",
+    ]
+    if r.get('diffs'):
+        parts.extend(_html_diff_parts(r['diffs'], context))
+    else:
+        parts.append(escape(r['after'][:2000]))
+    parts.append("</pre><hr>")
+    return "".join(parts)
+
+@perf.timed("export.csv")
+def write_csv(results, path):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["class", "name", "type", "recomputed", "summary"])
+        for r in results:
+            writer.writerow([r['class'], r['name'], r['type'], r.get('recomputed', True), r['summary']])
+
+@perf.timed("export.html")
+def write_html(results, path, context=5):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"<html><head>{HTML_STYLE}</head><body><h2>🧠 ServiceNow Record Summary</h2>")
+        for r in results:
+            f.write(_record_html(r, context))
+        f.write("</body></html>")
+
+def _pdf_batches(results, size):
+    batch = []
     for r in results:
-        html += f"<h3>{r['name']} ({r['type']})</h3>"
-        html += f"<p><b>AI Summary:</b> {r['summary']}</p><pre>"
-
-        if 'before' in r and r['before']:
-            before_lines = r['before'].splitlines()
-            after_lines = r['after'].splitlines()
-            matcher = difflib.SequenceMatcher(None, before_lines, after_lines)
-
-            for tag, i1, i2, j1, j2 in matcher.get_opcodes():
-                if tag == 'equal':
-                    continue
-
-                start_before = max(i1 - context, 0)
-                end_after = min(j2 + context, len(after_lines))
-
-                html += "<span class='context'>Context Before:\n"
-                html += "\n".join(f"{idx+1:4}: {escape(before_lines[idx])}" for idx in range(start_before, i1))
-                html += "\n</span>"
-
-                html += "<span class='removed'>"
-                html += "\n".join(f"{idx+1:4}: - {escape(before_lines[idx])}" for idx in range(i1, i2))
-                html += "\n</span>"
-
-                html += "<span class='added'>"
-                html += "\n".join(f"{idx+1:4}: + {escape(after_lines[idx])}" for idx in range(j1, j2))
-                html += "\n</span>"
+        batch.append(r)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+@perf.timed("export.pdf")
+def write_pdf(results, path, context=5, batch_size=None):
+    # O xhtml2pdf monta o documento todo em memória, então cada lote é renderizado separadamente
+    from xhtml2pdf import pisa
+    from pypdf import PdfWriter
+
+    merged = PdfWriter()
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(path) or None) as tmp:
+        for number, batch in enumerate(_pdf_batches(results, batch_size or PDF_BATCH_SIZE)):
+            heading = "<h2>ServiceNow Record Summary</h2>" if number == 0 else ""
+            html = f"<html><head>{HTML_STYLE}</head><body>{heading}{''.join(_record_html(r, context) for r in batch)}</body></html>"
+            part_path = os.path.join(tmp, f"part_{number:05}.pdf")
+            with open(part_path, "wb") as part:
+                pisa.CreatePDF(html, dest=part)
+            merged.append(part_path)
+        if not merged.pages:
+            with open(os.path.join(tmp, "empty.pdf"), "wb") as part:
+                pisa.CreatePDF("<html><body><h2>ServiceNow Record Summary</h2></body></html>", dest=part)
+            merged.append(os.path.join(tmp, "empty.pdf"))
+        with open(path, "wb") as f:
+            merged.write(f)
+    merged.close()
+
+class _DocxWriter:
+    # O python-docx procura o sectPr entre todos os filhos do body a cada add_paragraph e resolve o
+    # estilo pelo nome varrendo todos os estilos; com dezenas de milhares de parágrafos isso fica
+    # quadrático. Aqui cada parágrafo entra antes de um parágrafo sentinela (inserção O(1)) e os ids
+    # de estilo são resolvidos uma única vez.
+    def __init__(self, doc):
+        self.doc = doc
+        self._tail = doc.add_paragraph()
+        self._style_ids = {}
+
+    def add(self, text="", style_name=None):
+        p = self._tail.insert_paragraph_before(text)
+        if style_name is not None:
+            if style_name not in self._style_ids:
+                self._style_ids[style_name] = self.doc.styles[style_name].style_id
+            p._p.style = self._style_ids[style_name]
+        return p
+
+    def add_lines(self, lines, color=None):
+        # Um parágrafo por bloco (linhas separadas por quebra) em vez de um parágrafo por linha
+        p = self.add()
+        for position, line in enumerate(lines):
+            run = p.add_run(line)
+            if color is not None:
+                run.font.color.rgb = color
+            if position < len(lines) - 1:
+                run.add_break()
+
+    def close(self):
+        self._tail._p.getparent().remove(self._tail._p)
+
+@perf.timed("export.docx")
+def write_docx(results, path, context=5):
+    from docx import Document
+    from docx.shared import RGBColor
 
-                html += "<span class='context'>Context After:\n"
-                html += "\n".join(f"{idx+1:4}: {escape(after_lines[idx])}" for idx in range(j2, end_after))
-                html += "\n</span>"
-
-                html += "-"*40 + "\n"
-        else:
-            html += escape(r['after'][:2000])
-
-        html += "</pre><hr>"
-    html += "</body></html>"
-    output = BytesIO()
-    pisa.CreatePDF(StringIO(html), dest=output)
-    st.download_button("📄 Download PDF", data=output.getvalue(), file_name="servicenow_summary.pdf", mime="application/pdf")
-
-def export_docx(results, context=5):
     doc = Document()
-    doc.add_heading('🧠 ServiceNow Record Summary', 0)
+    writer = _DocxWriter(doc)
+    writer.add('🧠 ServiceNow Record Summary', 'Title')
 
     for r in results:
-        doc.add_heading(f"{r['name']} ({r['type']})", level=1)
-        doc.add_paragraph(f"AI Summary: {r['summary']}")
-
-        if 'before' in r and r['before']:
-            before_lines = r['before'].splitlines()
-            after_lines = r['after'].splitlines()
-            matcher = difflib.SequenceMatcher(None, before_lines, after_lines)
+        writer.add(f"{r['name']} ({_status_label(r)})", 'Heading 1')
+        writer.add(f"AI Summary: {r['summary']}")
 
-            for tag, i1, i2, j1, j2 in matcher.get_opcodes():
-                if tag == 'equal':
-                    continue
+        if r.get('diffs'):
+            for field, field_diff in r['diffs'].items():
+                writer.add(f"Field: {field}", 'Heading 2')
+                before_lines = field_diff['before_lines']
+                after_lines = field_diff['after_lines']
 
-                start_before = max(i1 - context, 0)
-                end_after = min(j2 + context, len(after_lines))
+                for hunk in hunks(field_diff, context):
+                    writer.add("Context Before:", 'Intense Quote')
+                    writer.add_lines([f"{idx+1:4}: {before_lines[idx]}" for idx in range(*hunk['context_before'])])
 
-                doc.add_paragraph("Context Before:", style='Intense Quote')
-                for idx in range(start_before, i1):
-                    doc.add_paragraph(f"{idx+1:4}: {before_lines[idx]}")
+                    writer.add("Changes:", 'Intense Quote')
+                    writer.add_lines([f"{idx+1:4}: - {before_lines[idx]}" for idx in range(hunk['i1'], hunk['i2'])], RGBColor(255, 0, 0))
+                    writer.add_lines([f"{idx+1:4}: + {after_lines[idx]}" for idx in range(hunk['j1'], hunk['j2'])], RGBColor(0, 128, 0))
 
-                doc.add_paragraph("Changes:", style='Intense Quote')
-                for idx in range(i1, i2):
-                    p = doc.add_paragraph()
-                    run = p.add_run(f"{idx+1:4}: - {before_lines[idx]}")
-                    run.font.color.rgb = RGBColor(255, 0, 0)
+                    writer.add("Context After:", 'Intense Quote')
+                    writer.add_lines([f"{idx+1:4}: {after_lines[idx]}" for idx in range(*hunk['context_after'])])
 
-                for idx in range(j1, j2):
-                    p = doc.add_paragraph()
-                    run = p.add_run(f"{idx+1:4}: + {after_lines[idx]}")
-                    run.font.color.rgb = RGBColor(0, 128, 0)
-
-                doc.add_paragraph("Context After:", style='Intense Quote')
-                for idx in range(j2, end_after):
-                    doc.add_paragraph(f"{idx+1:4}: {after_lines[idx]}")
-
-                doc.add_paragraph("\n" + "-"*40 + "\n")
+                    writer.add("\n" + "-"*40 + "\n")
         else:
-            doc.add_paragraph(r['after'][:2000])
-
-    output = BytesIO()
-    doc.save(output)
-    st.download_button("📄 Download DOCX", data=output.getvalue(), file_name="servicenow_summary.docx", mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document")
-
-def export_html(results, context=5):
-    html = """<html><head><style>
-    .added { background-color: #d4fcdc; }
-    .removed { background-color: #fddede; }
-    .context { color: #888; }
-    pre { background: #f4f4f4; padding: 10px; border-radius: 5px; }
-    </style></head><body><h2>🧠 ServiceNow Record Summary</h2>"""
-
-    for r in results:
-        html += f"<h3>{r['name']} ({r['type']})</h3>"
-        html += f"<p><strong>AI Summary:</strong> {r['summary']}</p><pre>"
-
-        if 'before' in r and r['before']:
-            before_lines = r['before'].splitlines()
-            after_lines = r['after'].splitlines()
-            matcher = difflib.SequenceMatcher(None, before_lines, after_lines)
-
-            for tag, i1, i2, j1, j2 in matcher.get_opcodes():
-                if tag == 'equal':
-                    continue
-
-                start_before = max(i1 - context, 0)
-                end_after = min(j2 + context, len(after_lines))
-
-                html += "<span class='context'>Context Before:\n"
-                html += "\n".join(f"{idx+1:4}: {escape(before_lines[idx])}" for idx in range(start_before, i1))
-                html += "\n</span>"
-
-                html += "<span class='removed'>"
-                html += "\n".join(f"{idx+1:4}: - {escape(before_lines[idx])}" for idx in range(i1, i2))
-                html += "\n</span>"
-
-                html += "<span class='added'>"
-                html += "\n".join(f"{idx+1:4}: + {escape(after_lines[idx])}" for idx in range(j1, j2))
-                html += "\n</span>"
-
-                html += "<span class='context'>Context After:\n"
-                html += "\n".join(f"{idx+1:4}: {escape(after_lines[idx])}" for idx in range(j2, end_after))
-                html += "\n</span>"
-
-                html += "-"*40 + "\n"
-        else:
-            html += escape(r['after'][:2000])
-
-        html += "</pre><hr>"
-    html += "</body></html>"
-
-    st.download_button("🌐 Download HTML", data=html, file_name="servicenow_summary.html", mime="text/html")
+            writer.add(r['after'][:2000])
+
+    writer.close()
+    doc.save(path)
+
+def warm_up():
+    # xhtml2pdf, pypdf e python-docx são importados no primeiro PDF/DOCX; aqui, antes (ver warmup.py)
+    import docx
+    import pypdf
+    import xhtml2pdf.pisa
+
+EXPORT_FORMATS = {
+    "csv": ("🗕️ Download CSV", "servicenow_records.csv", "text/csv", write_csv),
+    "docx": ("📄 Download DOCX", "servicenow_summary.docx", "application/vnd.openxmlformats-officedocument.wordprocessingml.document", write_docx),
+    "pdf": ("📄 Download PDF", "servicenow_summary.pdf", "application/pdf", write_pdf),
+    "html": ("🌐 Download HTML", "servicenow_summary.html", "text/html", write_html),
+}
+
+def start_export(fmt, results_factory):
+    # results_factory é chamado dentro da thread e deve gerar os resultados sob demanda (sem st.*)
+    writer = EXPORT_FORMATS[fmt][3]
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    prune_older_than(EXPORT_DIR, EXPORT_MAX_AGE_S)
+    fd, path = tempfile.mkstemp(suffix=f".{fmt}", dir=EXPORT_DIR)
+    os.close(fd)
+    return {"future": _export_pool.submit(lambda: writer(results_factory(), path)), "path": path}
+
+def _discard(job):
+    if job is not None and job["future"].done() and os.path.exists(job["path"]):
+        os.remove(job["path"])
+
+def _export_panel_body(run_id, results_factory):
+    jobs = st.session_state.setdefault(f"exports_{run_id}", {})
+    columns = st.columns(len(EXPORT_FORMATS))
+    for column, (fmt, (label, file_name, mime, _)) in zip(columns, EXPORT_FORMATS.items()):
+        job = jobs.get(fmt)
+        if job is not None and job["future"].done() and not os.path.exists(job["path"]):
+            # Arquivo já apagado por prune_older_than: volta a oferecer a geração
+            del jobs[fmt]
+            job = None
+        with column:
+            if job is None or job["future"].done():
+                if st.button(f"⚙️ Generate {fmt.upper()}" if job is None else f"🔄 Regenerate {fmt.upper()}", key=f"export_{fmt}_{run_id}"):
+                    _discard(job)
+                    jobs[fmt] = start_export(fmt, results_factory)
+                    # Rerun completo para o painel passar a acompanhar o job em segundo plano
+                    st.rerun()
+            if job is None:
+                continue
+            if not job["future"].done():
+                st.info(f"⏳ Generating {fmt.upper()}...")
+            elif job["future"].exception() is not None:
+                st.error(f"⚠️ {fmt.upper()} export failed: {job['future'].exception()}")
+            else:
+                with open(job["path"], "rb") as f:
+                    st.download_button(label, data=f, file_name=file_name, mime=mime, key=f"download_{fmt}_{run_id}")
+
+def export_panel(run_id, results_factory):
+    st.subheader("📤 Export")
+    jobs = st.session_state.get(f"exports_{run_id}", {})
+    pending = any(not job["future"].done() for job in jobs.values())
+    # Enquanto houver export rodando, só o painel é reexecutado a cada segundo para mostrar o botão de download
+    st.fragment(_export_panel_body, run_every=1 if pending else None)(run_id, results_factory)
@@ -0,0 +1,269 @@
+# Ingestão do XML customizado: spool em disco + mmap
+#
+# O arquivo enviado é copiado uma vez, em blocos, para SPOOL_DIR (com o sha256 do conteúdo no nome,
+# então reenviar o mesmo arquivo reaproveita a cópia) e mapeado com mmap. Um scanner de tags percorre
+# o buffer mapeado e guarda, por registro, só os offsets (início, fim) do texto de cada campo; os
+# digests saem direto dos bytes mapeados, sem criar str, e o texto só é decodificado quando alguém
+# pede (record.fields, em geral só para os modificados). Arquivos que não são UTF-8, com DOCTYPE ou
+# com namespace padrão na raiz seguem pelo iterparse do lxml (utils.iter_custom_records).
+from utils import FIELDS_TO_COMPARE, Record, combine_digests, iter_custom_records, prune_older_than
+from array import array
+from html import unescape
+import hashlib
+import mmap
+import os
+import re
+import tempfile
+import perf
+
+SPOOL_DIR = os.getenv("SPOOL_DIR", os.path.join(".cache", "uploads"))
+SPOOL_MAX_AGE_S = float(os.getenv("SPOOL_MAX_AGE_HOURS", "24")) * 3600
+COPY_CHUNK_SIZE = 1024 * 1024
+
+# Tags (grupos 1-3) ou a abertura de CDATA/comentário/PI (grupo 4), cujo fim é achado com find
+_TOKEN = re.compile(rb"<(?:(/?)([^\s/>!?]+)((?:[^>\"']|\"[^\"]*\"|'[^']*')*)>|(!\[CDATA\[|!--|\?))")
+_SECTION_END = {b"![CDATA[": b"]]>", b"!--": b"-->", b"?": b"?>"}
+_DECLARATION = re.compile(rb"<\?xml[^>]*?encoding\s*=\s*[\"']([A-Za-z0-9._-]+)[\"']")
+_UTF8_NAMES = frozenset((b"utf-8", b"utf8", b"us-ascii", b"ascii"))
+# Espaços que str.strip remove e que ocupam um byte em UTF-8
+_ASCII_SPACE = frozenset(b" \t\n\x0b\x0c\x1c\x1d\x1e\x1f")
+_FIELD_TAGS = [field.encode("ascii") for field in FIELDS_TO_COMPARE]
+_WANTED = frozenset(_FIELD_TAGS + [b"sys_id", b"sys_class_name", b"name", b"sys_name"])
+
+
+@perf.timed("ingest.spool")
+def spool_upload(fileobj, directory=SPOOL_DIR):
+    # Copia o arquivo (ex.: st.file_uploader) para o disco em blocos e retorna o caminho
+    os.makedirs(directory, exist_ok=True)
+    prune_older_than(directory, SPOOL_MAX_AGE_S, ".xml")
+    digest = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            for chunk in iter(lambda: fileobj.read(COPY_CHUNK_SIZE), b""):
+                digest.update(chunk)
+                out.write(chunk)
+        path = os.path.join(directory, f"{digest.hexdigest()}.xml")
+        if os.path.exists(path):
+            os.remove(tmp_path)
+            os.utime(path)
+        else:
+            os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return path
+
+
+def decode_text(raw):
+    # Mesmo texto que o lxml daria em element.text: quebras de linha normalizadas, entidades e CDATA
+    # resolvidos e corte no primeiro filho (elemento, comentário ou PI)
+    text = raw.decode("utf-8")
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    if "<" not in text and "&" not in text:
+        return text
+    parts = []
+    position = 0
+    while True:
+        cut = text.find("<", position)
+        if cut < 0:
+            parts.append(unescape(text[position:]))
+            break
+        parts.append(unescape(text[position:cut]))
+        if not text.startswith("<![CDATA[", cut):
+            break
+        end = text.find("]]>", cut + 9)
+        parts.append(text[cut + 9:end])
+        position = end + 3
+    return "".join(parts)
+
+
+def _strip(buffer, start, end):
+    while start < end and buffer[start] in _ASCII_SPACE:
+        start += 1
+    while end > start and buffer[end - 1] in _ASCII_SPACE:
+        end -= 1
+    return start, end
+
+
+def _span_digest(buffer, view, start, end):
+    # Digest do campo direto dos bytes mapeados quando o texto não precisa de decodificação
+    # (texto puro ou uma única seção CDATA, caso comum dos scripts); senão, decodifica e usa o
+    # mesmo critério de utils._field_digest_bytes
+    inner_start, inner_end = _strip(buffer, start, end)
+    if buffer[inner_start:inner_start + 9] == b"<![CDATA[" and buffer.find(b"]]>", inner_start, inner_end) == inner_end - 3:
+        inner_start, inner_end = inner_start + 9, inner_end - 3
+    elif buffer.find(b"<", inner_start, inner_end) >= 0 or buffer.find(b"&", inner_start, inner_end) >= 0:
+        inner_start = None
+    if inner_start is not None and buffer.find(b"\r", inner_start, inner_end) < 0:
+        inner_start, inner_end = _strip(buffer, inner_start, inner_end)
+        # Espaços Unicode nas pontas (ex.: NBSP) também são removidos pelo str.strip
+        if inner_start == inner_end or (buffer[inner_start] < 0x80 and buffer[inner_end - 1] < 0x80):
+            return hashlib.blake2b(view[inner_start:inner_end], digest_size=8).digest()
+    text = decode_text(buffer[start:end]).strip()
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest()
+
+
+class MappedValues:
+    # load_values dos registros do arquivo mapeado: offsets de cada campo num array ("q", -1 = ausente).
+    # No pickle (st.cache_data) vão caminho e offsets; o mmap é reaberto no primeiro acesso.
+    def __init__(self, path, mapped=None, spans=None, rows=None):
+        self.path = os.path.abspath(path)
+        self.spans = array("q") if spans is None else spans
+        self.rows = {} if rows is None else rows
+        self._mapped = mapped
+
+    def __getstate__(self):
+        return {"path": self.path, "spans": self.spans, "rows": self.rows}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"], spans=state["spans"], rows=state["rows"])
+
+    def add(self, key, spans):
+        # Retorna o loader do registro: a primeira ocorrência de uma chave é lida pela chave; as repetidas
+        # (raras) levam um RowValues com a própria linha, para cada registro ler o seu texto
+        row = len(self.spans) // (2 * len(FIELDS_TO_COMPARE))
+        self.spans.extend(spans)
+        if key in self.rows:
+            return RowValues(self, row)
+        self.rows[key] = row
+        return self
+
+    def row_values(self, row):
+        if self._mapped is None:
+            self._mapped = _map(self.path)
+        offset = row * 2 * len(FIELDS_TO_COMPARE)
+        spans = self.spans[offset:offset + 2 * len(FIELDS_TO_COMPARE)]
+        return tuple(
+            decode_text(self._mapped[spans[i]:spans[i + 1]]) if spans[i] >= 0 else ""
+            for i in range(0, len(spans), 2)
+        )
+
+    def __call__(self, key):
+        return self.row_values(self.rows[key])
+
+
+class RowValues:
+    # load_values de uma ocorrência repetida de chave no arquivo mapeado
+    __slots__ = ("values", "row")
+
+    def __init__(self, values, row):
+        self.values = values
+        self.row = row
+
+    def __call__(self, key):
+        return self.values.row_values(self.row)
+
+
+def _map(path):
+    with open(path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _content_start(buffer):
+    # Início do documento quando o scanner consegue tratá-lo (UTF-8, sem DOCTYPE); senão None
+    start = 3 if buffer[:3] == b"\xef\xbb\xbf" else 0
+    head = buffer[start:start + 4096]
+    if b"\x00" in head or b"<!DOCTYPE" in head:
+        return None
+    match = _DECLARATION.match(head)
+    if match and match.group(1).lower().replace(b"_", b"-") not in _UTF8_NAMES:
+        return None
+    return start
+
+
+def _text(buffer, span):
+    return decode_text(buffer[span[0]:span[1]]) if span else None
+
+
+def _make_record(buffer, view, tag, spans, values):
+    sys_id = (_text(buffer, spans.get(b"sys_id")) or "").strip()
+    class_name = (_text(buffer, spans.get(b"sys_class_name")) or tag.decode("utf-8")).strip()
+    name = _text(buffer, spans.get(b"name")) or _text(buffer, spans.get(b"sys_name"))
+    if not (sys_id and class_name):
+        return None
+    key = f"{class_name}_{sys_id}".strip().lower()
+    field_spans = []
+    digests = []
+    for field in _FIELD_TAGS:
+        span = spans.get(field)
+        if span is None:
+            field_spans += (-1, -1)
+            digests.append(hashlib.blake2b(b"", digest_size=8).digest())
+        else:
+            field_spans += span
+            digests.append(_span_digest(buffer, view, *span))
+    load_values = values.add(key, field_spans)
+    digests = b"".join(digests)
+    return key, Record(key, name, class_name, None, digests, combine_digests(digests), load_values)
+
+
+def iter_mapped_custom_records(path):
+    # Mesmos (key, record) de utils.iter_custom_records(path), a partir do arquivo mapeado
+    if os.path.getsize(path) == 0:
+        yield from iter_custom_records(path)
+        return
+    buffer = _map(path)
+    start = _content_start(buffer)
+    if start is None:
+        buffer.close()
+        yield from iter_custom_records(path)
+        return
+
+    values = MappedValues(path, buffer)
+    view = memoryview(buffer)
+    try:
+        # Pilha de (tag, início do conteúdo); raiz = nível 1, registros = 2, campos = 3
+        stack = []
+        spans = None
+        position = start
+        while True:
+            match = _TOKEN.search(buffer, position)
+            if match is None:
+                break
+            section = match.group(4)
+            if section is not None:
+                end = buffer.find(_SECTION_END[section], match.end())
+                if end < 0:
+                    raise ValueError(f"XML malformado em {path}: seção <{section.decode()} sem fim no byte {match.start()}")
+                position = end + len(_SECTION_END[section])
+                continue
+            position = match.end()
+            tag = match.group(2)
+            if not match.group(1):
+                self_closing = match.group(3).endswith(b"/")
+                if not stack and b"xmlns" in match.group(3):
+                    # Com namespace, o lxml qualifica as tags ({uri}sys_id); fica com ele
+                    yield from iter_custom_records(path)
+                    return
+                if self_closing:
+                    if len(stack) == 2 and tag in _WANTED:
+                        spans.setdefault(tag, (match.end(), match.end()))
+                    continue
+                if len(stack) == 1:
+                    spans = {}
+                stack.append((tag, match.end()))
+                continue
+            if not stack or stack[-1][0] != tag:
+                raise ValueError(f"XML malformado em {path}: </{tag.decode('utf-8', 'replace')}> inesperado no byte {match.start()}")
+            _, content_start = stack.pop()
+            depth = len(stack)
+            if depth == 2 and tag in _WANTED:
+                spans.setdefault(tag, (content_start, match.start()))
+            elif depth == 1:
+                item = _make_record(buffer, view, tag, spans, values)
+                if item:
+                    yield item
+        if stack:
+            raise ValueError(f"XML malformado em {path}: <{stack[-1][0].decode('utf-8', 'replace')}> não foi fechado")
+    finally:
+        view.release()
+
+
+def iter_custom_source(source):
+    # Caminhos passam pelo mmap; arquivos abertos (ou qualquer outra fonte) pelo iterparse
+    if isinstance(source, (str, os.PathLike)):
+        return iter_mapped_custom_records(os.fspath(source))
+    return iter_custom_records(source)
@@ -1,118 +1,271 @@
 # logic.py
-from utils import extract_base_records, extract_custom_records, group_by_class, get_friendly_class_name
-from ai_summary import summarize_changes
-from export import export_csv, export_docx, export_pdf, export_html
+from utils import group_by_class, get_friendly_class_name, BASE_VERSION_PATHS
+from compare import compare_records
+from summary_scheduler import summarize_many, summary_diffs, SchedulerStats
+from ai_summary import get_llm, get_summary_cache, DISABLED_MESSAGE
+from manifest import apply_manifest, update_manifest
+from export import export_panel
+from diff_model import compute_record_diff, render_html
+from search_index import SearchIndex, load_search_index, search
+from drift import drift_matrix, matrix_rows
+from base_cache import load_base_index
+from ingest import iter_custom_source
+import csv
+import io
+import perf
 import streamlit as st
-import difflib
 import streamlit.components.v1 as components
-import pandas as pd
-from html import escape
+import math
+import os
+import re
+import time
 
-FIELDS_TO_COMPARE = ["filter_condition", "condition", "active", "script", "template", "when", "order"]
+PAGE_SIZES = [10, 25, 50, 100]
+ALL_CLASSES = "__all__"
+UPLOADED_FILE = "Uploaded file"
+SEARCH_LIMIT = 500
 
-def process_comparison(base_tree, custom_tree):
-    base_records = extract_base_records(base_tree)
-    custom_records = extract_custom_records(custom_tree)
+def _recomputed_badge(record):
+    return "" if record.recomputed else " · ♻️ reused from previous run"
 
-    new_records = {}
-    modified_records = {}
-    unchanged_records = {}
+def _show_summary(summary):
+    st.success("Summary generated:")
+    st.markdown(summary)
 
-    for key, record in custom_records.items():
-        if key not in base_records:
-            new_records[key] = record
+def _title(record):
+    return f"{record.name} ({record.key})"
+
+def _compare(base_records, custom_source, manifest):
+    comparison = compare_records(base_records, perf.timed_iter("parse_custom", iter_custom_source(custom_source)))
+    reused = apply_manifest(comparison, base_records, manifest) if manifest is not None else 0
+    return comparison, reused
+
+@st.cache_data(show_spinner="Comparing records...", max_entries=8)
+def _compare_cached(run_id, _base_records, _custom_source, _manifest):
+    # run_id (hash da base + id do upload) é a chave; os demais argumentos não entram no hash
+    return _compare(_base_records, _custom_source, _manifest)
+
+def _run_state(run_id):
+    # Resumos e diffs já calculados ficam na sessão, então paginar não refaz nada
+    return st.session_state.setdefault(f"comparison_{run_id}", {"summaries": {}, "diffs": {}, "manifest_saved": False})
+
+def _record_diff(state, record):
+    if record.key not in state["diffs"]:
+        state["diffs"][record.key] = compute_record_diff(record.differences)
+    return state["diffs"][record.key]
+
+def _render_record(status, record, state):
+    if status == "new":
+        for field, value in record.fields.items():
+            st.markdown(f"**{field}**: \n```\n{value}\n```")
+    else:
+        for field, field_diff in _record_diff(state, record).items():
+            st.markdown(f"#### Field: {field}")
+            components.html(render_html(field_diff), height=300, scrolling=True)
+
+def _page_controls(status, records_by_class, total):
+    classes = sorted(records_by_class, key=get_friendly_class_name)
+    class_labels = {ALL_CLASSES: f"All classes ({total})"}
+    class_labels.update({c: f"{get_friendly_class_name(c)} ({len(records_by_class[c])})" for c in classes})
+    col_class, col_size, col_page = st.columns([3, 1, 1])
+    selected_class = col_class.selectbox("🧩 Class", [ALL_CLASSES] + classes, format_func=class_labels.get, key=f"class_{status}")
+    page_size = col_size.selectbox("Per page", PAGE_SIZES, index=1, key=f"page_size_{status}")
+    rows = records_by_class[selected_class] if selected_class != ALL_CLASSES else [r for c in classes for r in records_by_class[c]]
+    pages = max(1, math.ceil(len(rows) / page_size))
+    page = col_page.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1, key=f"page_{status}_{selected_class}_{page_size}")
+    return rows[(page - 1) * page_size:page * page_size]
+
+def _render_section(status, records, state):
+    icon = "🟢" if status == "new" else "✏️"
+    if not records:
+        st.info("No records in this section.")
+        return
+    page_rows = _page_controls(status, group_by_class(records), len(records))
+    ai_enabled = get_llm() is not None
+    summarize_page = ai_enabled and st.button("🧠 Summarize this page", key=f"summarize_page_{status}")
+
+    summary_jobs = []
+    placeholders = {}
+    for record in page_rows:
+        key = record.key
+        title = _title(record)
+        with st.expander(f"{icon} {title}{_recomputed_badge(record)}"):
+            _render_record(status, record, state)
+            summary = state["summaries"].get(key)
+            if summary is None and not ai_enabled:
+                st.caption(DISABLED_MESSAGE)
+            elif summary is None and (summarize_page or st.button("🧠 Generate summary", key=f"summarize_{key}")):
+                placeholders[key] = st.empty()
+                placeholders[key].info("⏳ Waiting for AI summary...")
+                summary_jobs.append((key, title, summary_diffs(status, record)))
+            elif summary is not None:
+                _show_summary(summary)
+
+    # Só os resumos pedidos (registro ou página) vão para o agendador, e aparecem conforme ficam prontos
+    if summary_jobs:
+        stats = SchedulerStats()
+        with st.spinner("Generating summaries with AI..."):
+            for key, summary in summarize_many(summary_jobs, stats=stats):
+                state["summaries"][key] = summary
+                state["dirty"] = True
+                with placeholders[key].container():
+                    _show_summary(summary)
+        report = stats.report()
+        st.caption(
+            f"🧠 {report['items'] + report['cached']} summaries in {report['elapsed_s']:.1f}s "
+            f"({report['throughput_per_s']:.2f}/s, {report['llm_calls']} LLM calls, {report['cached']} from cache) · "
+            f"latency p50 {report['p50_s']:.1f}s · p90 {report['p90_s']:.1f}s · p99 {report['p99_s']:.1f}s"
+        )
+        cache = get_summary_cache()
+        if cache is not None:
+            cache_stats = cache.stats()
+            st.caption(
+                f"🗄️ Summary cache: {cache_stats['hits']} hits · {cache_stats['misses']} misses · "
+                f"{cache_stats['evictions']} evictions · {cache_stats['entries']} entries"
+            )
+
+def _search_rows(source, hits, statuses=None):
+    for hit in hits:
+        yield {
+            "source": source, "status": statuses[hit["key"]] if statuses else "base",
+            "class": get_friendly_class_name(hit["class"]), "name": hit["name"], "key": hit["key"],
+            "field": hit["field"], "lines": ", ".join(map(str, hit["lines"])), "snippet": hit["snippet"],
+        }
+
+def search_panel(run_id, comparison, state, base_versions=BASE_VERSION_PATHS):
+    # Busca nos campos de código do arquivo enviado (índice em memória, montado na primeira busca)
+    # e das versões base (índice persistido ao lado do cache base)
+    st.subheader("🔎 Search scripts and conditions")
+    col_query, col_regex, col_case = st.columns([4, 1, 1])
+    query = col_query.text_input("Substring or regex (e.g. gs.getProperty)", key=f"search_{run_id}")
+    regex = col_regex.checkbox("Regex", key=f"search_regex_{run_id}")
+    case_sensitive = col_case.checkbox("Case sensitive", key=f"search_case_{run_id}")
+    scopes = st.multiselect("Search in", [UPLOADED_FILE] + list(base_versions), default=[UPLOADED_FILE], key=f"search_scope_{run_id}")
+    if not query.strip():
+        return
+    if regex:
+        try:
+            re.compile(query)
+        except re.error as e:
+            st.error(f"⚠️ Invalid regex: {e}")
+            return
+
+    started = time.perf_counter()
+    rows = []
+    for scope in scopes:
+        if scope == UPLOADED_FILE:
+            if "search_index" not in state:
+                records = {key: record for bucket in comparison.values() for key, record in bucket.items()}
+                statuses = {key: status for status, bucket in comparison.items() for key in bucket}
+                state["search_index"] = (SearchIndex.build(records), records, statuses)
+            index, records, statuses = state["search_index"]
+            rows.extend(_search_rows(scope, search(index, records, query, regex, case_sensitive, limit=SEARCH_LIMIT), statuses))
+        elif os.path.exists(base_versions[scope]):
+            index, base_index = load_search_index(base_versions[scope])
+            rows.extend(_search_rows(scope, search(index, base_index["records"], query, regex, case_sensitive, limit=SEARCH_LIMIT)))
         else:
-            diffs = {}
-            base_fields = base_records[key]["fields"]
-            custom_fields = record["fields"]
-            for field in FIELDS_TO_COMPARE:
-                if base_fields[field].strip() != custom_fields[field].strip():
-                    diffs[field] = {"before": base_fields[field], "after": custom_fields[field]}
-            if diffs:
-                modified_records[key] = {
-                    "name": record["name"],
-                    "differences": diffs,
-                    "class": record["class"]
+            st.warning(f"⚠️ Base version file not found: {base_versions[scope]}")
+    st.caption(f"{len(rows)} matches in {(time.perf_counter() - started) * 1000:.1f} ms")
+    if rows:
+        st.dataframe(rows, hide_index=True)
+
+def drift_panel(run_id, comparison, state, base_versions=BASE_VERSION_PATHS):
+    # Reaproveita os registros custom já extraídos nesta comparação; cada versão vem do índice base em cache
+    st.subheader("📊 Drift across base versions")
+    available = {version: path for version, path in base_versions.items() if os.path.exists(path)}
+    if not available:
+        st.info("No base version files available.")
+        return
+    if "drift" not in state:
+        if not st.button(f"Compare against all {len(available)} base versions", key=f"drift_{run_id}"):
+            return
+        custom_records = {key: compared.record for bucket in comparison.values() for key, compared in bucket.items()}
+        with st.spinner("Comparing against every base version..."):
+            state["drift"] = drift_matrix(custom_records, {version: load_base_index(path)["records"] for version, path in available.items()})
+    matrix = state["drift"]
+
+    st.dataframe([{"version": version, **totals} for version, totals in matrix["totals"].items()], hide_index=True)
+    churn = {}
+    for entry in matrix["field_churn"]:
+        row = churn.setdefault(entry["field"], {"field": entry["field"]})
+        row[entry["version"]] = entry["modified"]
+        if entry["base_changed_since_previous"] is not None:
+            row[f"{entry['version']} (base changed)"] = entry["base_changed_since_previous"]
+    st.caption("Customized records differing from each version, per field (and how many of them changed in the base since the previous version)")
+    st.dataframe(list(churn.values()), hide_index=True)
+
+    rows = list(matrix_rows(matrix))
+    if st.checkbox("Only records whose status differs between versions", value=True, key=f"drift_changing_{run_id}"):
+        rows = [row for row in rows if len({row[version] for version in matrix["versions"]}) > 1]
+    st.dataframe(rows, hide_index=True)
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=list(next(matrix_rows(matrix), {"key": None})))
+    writer.writeheader()
+    writer.writerows(matrix_rows(matrix))
+    st.download_button("🗕️ Download drift matrix (CSV)", buffer.getvalue(), file_name="drift_matrix.csv", mime="text/csv", key=f"drift_csv_{run_id}")
+
+def iter_results(comparison, summaries, diff_cache=None):
+    # Gera as linhas dos relatórios uma a uma; roda na thread de export, então não usa st.*
+    diff_cache = diff_cache if diff_cache is not None else {}
+    for status in ("new", "modified"):
+        for class_name, records in group_by_class(comparison[status]).items():
+            for record in records:
+                result = {
+                    "name": _title(record), "key": record.key, "type": status,
+                    "summary": summaries.get(record.key) or "", "class": class_name,
+                    "recomputed": record.recomputed,
                 }
-            else:
-                unchanged_records[key] = record
+                if status == "new":
+                    result.update({"before": "", "after": str(record.fields)})
+                else:
+                    result["diffs"] = diff_cache.get(record.key) or compute_record_diff(record.differences)
+                yield result
+
+def process_comparison(base_records, custom_source, manifest=None, run_id=None):
+    # base_records vem do índice em cache (base_cache); o custom é consumido em streaming, sem montar a árvore
+    # Com um RunManifest, registros iguais aos da última execução reaproveitam o resumo salvo
+    # Com run_id, o resultado da comparação é memorizado (st.cache_data) entre os reruns da paginação
+    if run_id is None:
+        comparison, reused = _compare(base_records, custom_source, manifest)
+        run_id = str(id(comparison))
+    else:
+        comparison, reused = _compare_cached(run_id, base_records, custom_source, manifest)
+    new_records = comparison["new"]
+    modified_records = comparison["modified"]
+    unchanged_records = comparison["unchanged"]
+
+    state = _run_state(run_id)
+    for status in ("new", "modified"):
+        for key, record in comparison[status].items():
+            if record.summary is not None:
+                state["summaries"].setdefault(key, record.summary)
 
     st.subheader("📌 Results")
     st.markdown(f"**New records:** {len(new_records)}")
     st.markdown(f"**Modified records:** {len(modified_records)}")
     st.markdown(f"**Unchanged records:** {len(unchanged_records)}")
+    if manifest is not None:
+        total = len(new_records) + len(modified_records) + len(unchanged_records)
+        st.markdown(f"**Recomputed records:** {total - reused} (♻️ {reused} reused from the previous run)")
 
-    results = []
-    new_by_class = group_by_class(new_records)
-    modified_by_class = group_by_class(modified_records)
+    tab_modified, tab_new = st.tabs([f"✏️ Modified Records ({len(modified_records)})", f"🆕 New Records ({len(new_records)})"])
+    with tab_modified:
+        _render_section("modified", modified_records, state)
+    with tab_new:
+        _render_section("new", new_records, state)
 
-    with st.expander("🆕 New Records" if new_records else ""):
-        for class_name, records in new_by_class.items():
-            friendly_name = get_friendly_class_name(class_name)
-            st.markdown(f"## 🧩 {friendly_name} ({len(records)})")
-            for record in records:
-                key = record["key"]
-                title = f"{record['name']} ({key})"
-                st.markdown(f"### 🟢 {title}")
-                for field, value in record["fields"].items():
-                    st.markdown(f"**{field}**: \n```\n{value}\n```")
-                with st.spinner("Generating summary with AI..."):
-                    summary = summarize_changes(title, {f: {"before": "", "after": v} for f, v in record["fields"].items() if v.strip()})
-                st.success("Summary generated:")
-                st.markdown(summary)
-                results.append({"name": title, "type": "new", "summary": summary, "class": class_name, "before": "", "after": str(record["fields"])})
-
-    with st.expander("✏️ Modified Records" if modified_records else ""):
-        for class_name, records in modified_by_class.items():
-            friendly_name = get_friendly_class_name(class_name)
-            st.markdown(f"## 🧩 {friendly_name} ({len(records)})")
-            for record in records:
-                key = record["key"]
-                title = f"{record['name']} ({key})"
-                st.markdown(f"### ✏️ {title}")
-                for field, values in record["differences"].items():
-                    st.markdown(f"#### Field: {field}")
-                    before_lines = values["before"].splitlines()
-                    after_lines = values["after"].splitlines()
-                    matcher = difflib.SequenceMatcher(None, before_lines, after_lines)
-                    html = "<pre style='font-family: monospace;'>"
-                    context = 5
-                    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
-                        if tag == "equal":
-                            if i2 - i1 <= context * 2:
-                                for offset, line in enumerate(before_lines[i1:i2]):
-                                    html += f"<span style='color:#888;'>  {i1 + offset + 1:>4}: {escape(line)}</span><br>"
-                            else:
-                                html += "<span style='color:#aaa;'>  ...</span><br>"
-                        elif tag == "replace":
-                            start = max(i1 - context, 0)
-                            end = min(i2 + context, len(before_lines))
-                            for offset, line in enumerate(before_lines[start:i1]):
-                                html += f"<span style='color:#888;'>  {start + offset + 1:>4}: {escape(line)}</span><br>"
-                            for offset, line in enumerate(before_lines[i1:i2]):
-                                html += f"<span style='background-color:#fddede;'>- {i1 + offset + 1:>4}: {escape(line)}</span><br>"
-                            for offset, line in enumerate(after_lines[j1:j2]):
-                                html += f"<span style='background-color:#d4fcdc;'>+ {j1 + offset + 1:>4}: {escape(line)}</span><br>"
-                            for offset, line in enumerate(after_lines[j2:j2+context]):
-                                if j2 + offset < len(after_lines):
-                                    html += f"<span style='color:#888;'>  {j2 + offset + 1:>4}: {escape(line)}</span><br>"
-                        elif tag == "delete":
-                            for offset, line in enumerate(before_lines[i1:i2]):
-                                html += f"<span style='background-color:#fddede;'>- {i1 + offset + 1:>4}: {escape(line)}</span><br>"
-                        elif tag == "insert":
-                            for offset, line in enumerate(after_lines[j1:j2]):
-                                html += f"<span style='background-color:#d4fcdc;'>+ {j1 + offset + 1:>4}: {escape(line)}</span><br>"
-                    html += "</pre>"
-                    components.html(html, height=300, scrolling=True)
-                with st.spinner("Generating summary with AI..."):
-                    summary = summarize_changes(title, record["differences"])
-                st.success("Summary generated:")
-                st.markdown(summary)
-                results.append({"name": title, "type": "modified", "summary": summary, "class": class_name, "before": str(values["before"]), "after": str(values["after"])})
-
-    # Export buttons
-    if results:
-        export_csv(results)
-        export_docx(results)
-        export_pdf(results)
-        export_html(results)
+    if manifest is not None and (state.pop("dirty", False) or not state["manifest_saved"]):
+        for status in ("new", "modified"):
+            for key, record in comparison[status].items():
+                record.summary = state["summaries"].get(key)
+        update_manifest(comparison, base_records, manifest, store_summaries=get_llm() is not None)
+        state["manifest_saved"] = True
+
+    search_panel(run_id, comparison, state)
+    drift_panel(run_id, comparison, state)
+
+    # Exports só são gerados quando pedidos, em segundo plano, com um retrato dos resumos atuais
+    if new_records or modified_records:
+        summaries = dict(state["summaries"])
+        diff_cache = state["diffs"]
+        export_panel(run_id, lambda: iter_results(comparison, summaries, diff_cache))
@@ -0,0 +1,104 @@
+# Manifesto de execução para re-execuções incrementais
+#
+# Para cada cliente x versão base (pelo hash do XML base) guarda o digest de cada registro
+# custom, o digest do registro base correspondente, o status e o resumo da IA. Na execução
+# seguinte, registros com os mesmos digests reaproveitam status e resumo; só o delta é
+# recalculado e marcado com recomputed=True.
+from ai_summary import is_generated_summary
+import json
+import os
+import re
+import tempfile
+import perf
+
+MANIFEST_DIR = os.getenv("MANIFEST_DIR", os.path.join(".cache", "manifests"))
+
+
+def _slug(text):
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", text.strip()).strip("_") or "default"
+
+
+class RunManifest:
+
+    def __init__(self, customer, base_hash, directory=MANIFEST_DIR):
+        self.customer = customer
+        self.base_hash = base_hash
+        self.path = os.path.join(directory, f"{_slug(customer)}__{base_hash[:16]}.json")
+        self.previous = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if data.get("base_hash") != self.base_hash:
+            return {}
+        return data.get("records", {})
+
+    def lookup(self, key, custom_digest, base_digest, status):
+        entry = self.previous.get(key)
+        if entry and entry["custom_digest"] == custom_digest and entry["base_digest"] == base_digest and entry["status"] == status:
+            return entry
+        return None
+
+    def save(self, entries):
+        # Sessões com o mesmo cliente e base podem salvar juntas: cada uma grava no seu temporário
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"customer": self.customer, "base_hash": self.base_hash, "records": entries}, f)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.previous = entries
+
+
+def _base_digest(base_records, key):
+    base_record = base_records.get(key)
+    return base_record.digest if base_record else None
+
+
+@perf.timed("manifest.apply")
+def apply_manifest(comparison, base_records, manifest):
+    # Marca cada registro com recomputed e copia o resumo anterior quando os digests não mudaram
+    reused = 0
+    for status, records in comparison.items():
+        for key, record in records.items():
+            entry = manifest.lookup(key, record.digest, _base_digest(base_records, key), status)
+            if entry is not None and status != "unchanged" and not is_generated_summary(entry.get("summary")):
+                # Sem resumo salvo (ex.: IA desligada ou erro na execução anterior) não há o que reaproveitar
+                entry = None
+            record.recomputed = entry is None
+            if entry is None:
+                continue
+            reused += 1
+            if status != "unchanged":
+                record.summary = entry["summary"]
+    return reused
+
+
+@perf.timed("manifest.update")
+def update_manifest(comparison, base_records, manifest, store_summaries=True):
+    # Salva só resumos gerados pelo modelo; sem um novo (execução sem resumos, IA desligada ou erro),
+    # mantém o da entrada anterior se os digests e o status não mudaram
+    entries = {}
+    for status, records in comparison.items():
+        for key, record in records.items():
+            base_digest = _base_digest(base_records, key)
+            summary = record.summary if store_summaries and is_generated_summary(record.summary) else None
+            if summary is None:
+                previous = manifest.lookup(key, record.digest, base_digest, status)
+                if previous is not None and is_generated_summary(previous.get("summary")):
+                    summary = previous["summary"]
+            entries[key] = {
+                "custom_digest": record.digest,
+                "base_digest": base_digest,
+                "status": status,
+                "summary": summary,
+            }
+    manifest.save(entries)
@@ -0,0 +1,254 @@
+# Instrumentação leve das etapas do pipeline (parse, decodificação, comparação, diffs, IA, exports)
+#
+# Cada etapa acumula chamadas, itens, tempo total, tempo próprio (sem as etapas internas da mesma
+# thread), erros e o quanto o pico de RSS do processo subiu durante ela. As últimas SAMPLE_SIZE
+# durações ficam guardadas para os percentis. O custo é um perf_counter, um getrusage e um lock por
+# chamada, então fica ligado por padrão (PERF_ENABLED=false desliga).
+# Erros passam por log_error: vão para o logging e ficam nos últimos ERROR_HISTORY para a interface.
+# Contadores avulsos (ex.: acertos e despejos do cache de resumos) passam por count.
+from collections import deque
+from functools import wraps
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PERF_ENABLED = os.getenv("PERF_ENABLED", "true").lower() == "true"
+SAMPLE_SIZE = 1000
+ERROR_HISTORY = 50
+METRIC_PREFIX = "health_check"
+
+logger = logging.getLogger("upgrade_health_check")
+
+_lock = threading.Lock()
+_local = threading.local()
+_stages = {}
+_counters = {}
+_errors = deque(maxlen=ERROR_HISTORY)
+
+
+def peak_rss_bytes():
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss vem em KB no Linux e em bytes no macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _new_stage():
+    return {
+        "calls": 0, "items": 0, "errors": 0, "total_s": 0.0, "self_s": 0.0, "max_s": 0.0,
+        "rss_growth_bytes": 0, "samples": deque(maxlen=SAMPLE_SIZE),
+    }
+
+
+def record(name, elapsed, items=1, self_elapsed=None, rss_growth=0, error=False):
+    if not PERF_ENABLED:
+        return
+    with _lock:
+        stats = _stages.get(name)
+        if stats is None:
+            stats = _stages[name] = _new_stage()
+        stats["calls"] += 1
+        stats["items"] += items
+        stats["errors"] += error
+        stats["total_s"] += elapsed
+        stats["self_s"] += elapsed if self_elapsed is None else self_elapsed
+        stats["max_s"] = max(stats["max_s"], elapsed)
+        stats["rss_growth_bytes"] = max(stats["rss_growth_bytes"], rss_growth)
+        stats["samples"].append(elapsed)
+
+
+def count(name, value=1):
+    if not PERF_ENABLED or not value:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def _children():
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+class stage:
+    # Context manager de uma etapa. Etapas aninhadas na mesma thread descontam o próprio tempo
+    # do tempo próprio da etapa externa.
+    __slots__ = ("name", "items", "_stack", "_rss_before", "_started")
+
+    def __init__(self, name, items=1):
+        self.name = name
+        self.items = items
+
+    def __enter__(self):
+        if PERF_ENABLED:
+            self._stack = _children()
+            self._stack.append(0.0)
+            self._rss_before = peak_rss_bytes()
+            self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if not PERF_ENABLED:
+            return False
+        elapsed = time.perf_counter() - self._started
+        inner = self._stack.pop()
+        if self._stack:
+            self._stack[-1] += elapsed
+        record(self.name, elapsed, self.items, elapsed - inner, peak_rss_bytes() - self._rss_before, exc_type is not None)
+        return False
+
+
+def timed(name):
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def timed_iter(name, iterable):
+    # Para geradores (iter_*_records): conta só o tempo gasto dentro do next(), não o do consumidor
+    if not PERF_ENABLED:
+        yield from iterable
+        return
+    iterator = iter(iterable)
+    total = 0.0
+    count = 0
+    rss_before = peak_rss_bytes()
+    error = False
+    try:
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                break
+            finally:
+                elapsed = time.perf_counter() - started
+                total += elapsed
+                stack = _children()
+                if stack:
+                    stack[-1] += elapsed
+            count += 1
+            yield item
+    except BaseException as e:
+        error = not isinstance(e, GeneratorExit)
+        raise
+    finally:
+        record(name, total, count, total, peak_rss_bytes() - rss_before, error)
+
+
+def log_error(stage_name, message, exc_info=None):
+    logger.warning(message, exc_info=exc_info)
+    with _lock:
+        _errors.append({"time": time.time(), "stage": stage_name, "message": message})
+    if PERF_ENABLED:
+        with _lock:
+            stats = _stages.get(stage_name)
+            if stats is None:
+                stats = _stages[stage_name] = _new_stage()
+            stats["errors"] += 1
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    rank = max(1, round(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def snapshot(include_samples=False):
+    with _lock:
+        stages = {name: {**stats, "samples": list(stats["samples"])} for name, stats in _stages.items()}
+        counters = dict(_counters)
+        errors = list(_errors)
+    for stats in stages.values():
+        samples = sorted(stats["samples"])
+        stats["mean_s"] = stats["total_s"] / stats["calls"] if stats["calls"] else 0.0
+        stats["p50_s"] = percentile(samples, 50)
+        stats["p90_s"] = percentile(samples, 90)
+        stats["p99_s"] = percentile(samples, 99)
+        if not include_samples:
+            del stats["samples"]
+    return {"pid": os.getpid(), "peak_rss_bytes": peak_rss_bytes(), "stages": stages, "counters": counters, "errors": errors}
+
+
+def merge(other):
+    # Junta um snapshot(include_samples=True) de outro processo (ex.: workers do batch)
+    with _lock:
+        for name, theirs in other["stages"].items():
+            stats = _stages.get(name)
+            if stats is None:
+                stats = _stages[name] = _new_stage()
+            for field in ("calls", "items", "errors", "total_s", "self_s"):
+                stats[field] += theirs[field]
+            stats["max_s"] = max(stats["max_s"], theirs["max_s"])
+            stats["rss_growth_bytes"] = max(stats["rss_growth_bytes"], theirs["rss_growth_bytes"])
+            stats["samples"].extend(theirs.get("samples", []))
+        for name, value in other.get("counters", {}).items():
+            _counters[name] = _counters.get(name, 0) + value
+        _errors.extend(other.get("errors", []))
+
+
+def reset():
+    with _lock:
+        _stages.clear()
+        _counters.clear()
+        _errors.clear()
+
+
+def to_json(data=None):
+    return json.dumps(data or snapshot(), indent=2)
+
+
+def _label(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def to_prometheus(data=None):
+    # Formato texto do Prometheus (exposition format 0.0.4)
+    data = data or snapshot()
+    metrics = [
+        ("stage_calls_total", "counter", "Calls per pipeline stage", "calls"),
+        ("stage_items_total", "counter", "Items processed per pipeline stage", "items"),
+        ("stage_errors_total", "counter", "Errors per pipeline stage", "errors"),
+        ("stage_seconds_total", "counter", "Wall time per pipeline stage, including nested stages", "total_s"),
+        ("stage_self_seconds_total", "counter", "Wall time per pipeline stage, excluding nested stages", "self_s"),
+        ("stage_max_seconds", "gauge", "Slowest call per pipeline stage", "max_s"),
+        ("stage_rss_growth_bytes", "gauge", "Largest peak RSS growth during one call of the stage", "rss_growth_bytes"),
+    ]
+    lines = []
+    for metric, kind, help_text, field in metrics:
+        name = f"{METRIC_PREFIX}_{metric}"
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for stage_name, stats in sorted(data["stages"].items()):
+            lines.append(f'{name}{{stage="{_label(stage_name)}"}} {stats[field]}')
+    name = f"{METRIC_PREFIX}_stage_latency_seconds"
+    lines.append(f"# HELP {name} Latency quantiles over the last {SAMPLE_SIZE} calls per pipeline stage")
+    lines.append(f"# TYPE {name} gauge")
+    for stage_name, stats in sorted(data["stages"].items()):
+        for quantile, field in (("0.5", "p50_s"), ("0.9", "p90_s"), ("0.99", "p99_s")):
+            lines.append(f'{name}{{stage="{_label(stage_name)}",quantile="{quantile}"}} {stats[field]}')
+    name = f"{METRIC_PREFIX}_events_total"
+    lines.append(f"# HELP {name} Event counters (cache hits, misses, evictions)")
+    lines.append(f"# TYPE {name} counter")
+    for counter, value in sorted(data.get("counters", {}).items()):
+        lines.append(f'{name}{{event="{_label(counter)}"}} {value}')
+    name = f"{METRIC_PREFIX}_process_peak_rss_bytes"
+    lines.append(f"# HELP {name} Peak resident set size of the process")
+    lines.append(f"# TYPE {name} gauge")
+    lines.append(f"{name} {data['peak_rss_bytes']}")
+    return "\n".join(lines) + "\n"
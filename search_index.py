@@ -0,0 +1,242 @@
+# Índice invertido de trigramas sobre os campos de código dos registros
+#
+# Cada registro entra com o conjunto de trigramas (em minúsculas) de script, condition,
+# filter_condition e template; a busca intersecta as listas dos trigramas do termo (das mais
+# raras para as mais comuns) e só confere o texto dos candidatos. Em regex, os literais
+# obrigatórios do padrão viram o pré-filtro; sem nenhum literal com 3+ caracteres, todos os
+# registros são conferidos. O índice das versões base fica em SQLite ao lado do índice base
+# ({hash}.search.sqlite em base_cache.CACHE_DIR); o do arquivo enviado é montado em memória.
+# Registros com caracteres em que lower() não coincide com o IGNORECASE do re (İ, ſ, ς, µ...)
+# ficam fora do pré-filtro e são sempre conferidos; termos com esses caracteres não usam o índice.
+from array import array
+from bisect import bisect_left
+from functools import lru_cache
+import os
+import re
+import sqlite3
+import perf
+
+try:
+    import re._parser as sre_parse
+    from re._constants import LITERAL, SUBPATTERN, MAX_REPEAT, MIN_REPEAT, POSSESSIVE_REPEAT
+except ImportError:  # Python < 3.11
+    import sre_parse
+    from sre_constants import LITERAL, SUBPATTERN, MAX_REPEAT, MIN_REPEAT
+    POSSESSIVE_REPEAT = None
+
+SEARCH_FIELDS = ["script", "condition", "filter_condition", "template"]
+SEARCH_FORMAT_VERSION = "2"
+MAX_LINES_PER_HIT = 20
+
+
+@lru_cache(maxsize=None)
+def _unstable_char(char):
+    # lower() muda o tamanho (İ), não junta as variantes que o re iguala (ſ/s, ς/σ, µ/μ) ou depende do
+    # contexto (Σ final)
+    lower = char.lower()
+    return len(lower) != 1 or lower != char.upper().lower() or char == "\u03a3"
+
+
+def has_unstable_case(text):
+    # Texto em que os trigramas em minúsculas podem não bater com uma busca sem diferenciar maiúsculas
+    if text.isascii():
+        return False
+    return any(_unstable_char(char) for char in set(text) if not char.isascii())
+
+
+def trigrams(text):
+    # Trigramas de cada linha (sem atravessar quebras); linhas repetidas nos scripts são processadas uma vez
+    grams = set()
+    for line in set(text.lower().split("\n")):
+        grams.update(line[i:i + 3] for i in range(len(line) - 2))
+    return grams
+
+
+def _record_text(record):
+    fields = record.fields
+    return "\n".join(fields[field] for field in SEARCH_FIELDS)
+
+
+class SearchIndex:
+
+    def __init__(self, keys, postings, unstable=None):
+        self.keys = keys
+        self.postings = postings
+        # Documentos com has_unstable_case: entram em todos os resultados do pré-filtro
+        self.unstable = array("I") if unstable is None else unstable
+
+    @classmethod
+    def build(cls, records):
+        keys = []
+        postings = {}
+        unstable = array("I")
+        for doc_id, (key, record) in enumerate(records.items()):
+            keys.append(key)
+            text = _record_text(record)
+            if has_unstable_case(text):
+                unstable.append(doc_id)
+            for gram in trigrams(text):
+                posting = postings.get(gram)
+                if posting is None:
+                    posting = postings[gram] = array("I")
+                posting.append(doc_id)
+        return cls(keys, postings, unstable)
+
+    def candidates(self, literals):
+        # Chaves que contêm todos os trigramas dos literais; None quando não há como filtrar
+        if any(has_unstable_case(literal) for literal in literals):
+            return None
+        grams = set()
+        for literal in literals:
+            grams |= trigrams(literal)
+        if not grams:
+            return None
+        postings = sorted((self.postings.get(gram, ()) for gram in grams), key=len)
+        found = set(postings[0])
+        for posting in postings[1:]:
+            if not found:
+                break
+            if len(found) * 16 < len(posting):
+                # Poucos candidatos numa lista longa: busca binária em vez de percorrer a lista inteira
+                found = {doc_id for doc_id in found if _contains(posting, doc_id)}
+            else:
+                found.intersection_update(posting)
+        found.update(self.unstable)
+        return [self.keys[doc_id] for doc_id in sorted(found)]
+
+
+def _contains(sorted_ids, value):
+    position = bisect_left(sorted_ids, value)
+    return position < len(sorted_ids) and sorted_ids[position] == value
+
+
+def required_literals(pattern):
+    # Sequências de literais que toda ocorrência do regex precisa conter (aproximação conservadora)
+    literals = []
+
+    def walk(items):
+        current = []
+        for op, arg in items:
+            if op is LITERAL:
+                current.append(chr(arg))
+                continue
+            if current:
+                literals.append("".join(current))
+                current = []
+            if op is SUBPATTERN:
+                walk(arg[-1])
+            elif op in (MAX_REPEAT, MIN_REPEAT, POSSESSIVE_REPEAT) and arg[0] >= 1:
+                walk(arg[2])
+        if current:
+            literals.append("".join(current))
+
+    walk(sre_parse.parse(pattern))
+    return [literal for literal in literals if len(literal) >= 3]
+
+
+def compile_query(query, regex=False, case_sensitive=False):
+    flags = 0 if case_sensitive else re.IGNORECASE
+    if regex:
+        return re.compile(query, flags), required_literals(query)
+    return re.compile(re.escape(query), flags), [query]
+
+
+@perf.timed("search")
+def search(index, records, query, regex=False, case_sensitive=False, classes=None, limit=None):
+    # Retorna um hit por registro x campo: key, name, class, field, linhas (1-based) e o trecho da primeira
+    matcher, literals = compile_query(query, regex, case_sensitive)
+    keys = index.candidates(literals) if index is not None else None
+    if keys is None:
+        keys = list(records)
+    hits = []
+    for key in keys:
+        record = records.get(key)
+        if record is None or (classes and record.class_name not in classes):
+            continue
+        fields = record.fields
+        for field in SEARCH_FIELDS:
+            text = fields[field]
+            if not text or matcher.search(text) is None:
+                continue
+            lines = [number for number, line in enumerate(text.splitlines(), start=1) if matcher.search(line)]
+            snippet = text.splitlines()[lines[0] - 1].strip()[:200] if lines else text.strip()[:200]
+            hits.append({
+                "key": key, "name": record.name, "class": record.class_name, "field": field,
+                "lines": lines[:MAX_LINES_PER_HIT], "snippet": snippet,
+            })
+        if limit is not None and len(hits) >= limit:
+            break
+    return hits
+
+
+def write_search_index(db_path, index, source_hash):
+    from base_cache import replace_atomically
+
+    def write(tmp_path):
+        conn = sqlite3.connect(tmp_path)
+        try:
+            conn.executescript("""
+                CREATE TABLE meta (name TEXT PRIMARY KEY, value TEXT);
+                CREATE TABLE docs (id INTEGER PRIMARY KEY, key TEXT);
+                CREATE TABLE postings (trigram TEXT PRIMARY KEY, ids BLOB);
+                CREATE TABLE unstable (ids BLOB);
+            """)
+            conn.executemany("INSERT INTO meta VALUES (?, ?)", [
+                ("format_version", SEARCH_FORMAT_VERSION), ("source_hash", source_hash),
+            ])
+            conn.executemany("INSERT INTO docs VALUES (?, ?)", enumerate(index.keys))
+            conn.executemany("INSERT INTO postings VALUES (?, ?)", (
+                (gram, posting.tobytes()) for gram, posting in index.postings.items()
+            ))
+            conn.execute("INSERT INTO unstable VALUES (?)", (index.unstable.tobytes(),))
+            conn.commit()
+        finally:
+            conn.close()
+
+    replace_atomically(db_path, write)
+
+
+def read_search_index(db_path):
+    try:
+        conn = sqlite3.connect(db_path)
+        try:
+            meta = dict(conn.execute("SELECT name, value FROM meta"))
+            if meta.get("format_version") != SEARCH_FORMAT_VERSION:
+                return None
+            keys = [key for _, key in conn.execute("SELECT id, key FROM docs ORDER BY id")]
+            postings = {}
+            for gram, ids in conn.execute("SELECT trigram, ids FROM postings"):
+                posting = postings[gram] = array("I")
+                posting.frombytes(ids)
+            unstable = array("I")
+            for (ids,) in conn.execute("SELECT ids FROM unstable"):
+                unstable.frombytes(ids)
+        finally:
+            conn.close()
+    except sqlite3.DatabaseError as e:
+        perf.log_error("search.load", f"⚠️ Índice de busca inválido em {db_path}, reconstruindo: {e}")
+        return None
+    return SearchIndex(keys, postings, unstable)
+
+
+def load_search_index(path):
+    # Índice de busca de uma versão base (caminho do XML), gravado ao lado do índice base
+    from base_cache import load_base_index
+
+    base_index = load_base_index(path)
+    return _load_search_index_cached(base_index["source_hash"], path), base_index
+
+
+@lru_cache(maxsize=8)
+@perf.timed("search.load")
+def _load_search_index_cached(source_hash, path):
+    from base_cache import CACHE_DIR, build_lock, load_base_index
+
+    db_path = os.path.join(CACHE_DIR, f"{source_hash}.search.sqlite")
+    with build_lock(db_path):
+        index = read_search_index(db_path) if os.path.exists(db_path) else None
+        if index is None:
+            with perf.stage("search.build"):
+                index = SearchIndex.build(load_base_index(path)["records"])
+            write_search_index(db_path, index, source_hash)
+        return index
@@ -0,0 +1,87 @@
+# Cache persistente (SQLite) dos resumos gerados pelo LLM
+#
+# A chave é o hash de (modelo, prompt de sistema, prompt com o diff unificado), então o mesmo
+# diff reaparecendo em outra execução ou upload não gera uma nova chamada ao modelo.
+# Entradas mais velhas que max_age_days são descartadas e, acima de max_entries, as menos
+# usadas recentemente saem primeiro. Acertos, faltas e despejos também vão para os contadores
+# do perf (summary_cache.hits/misses/evictions).
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import perf
+
+SUMMARY_CACHE_PATH = os.getenv("SUMMARY_CACHE_PATH", os.path.join(".cache", "summaries.sqlite"))
+SUMMARY_CACHE_MAX_ENTRIES = int(os.getenv("SUMMARY_CACHE_MAX_ENTRIES", "20000"))
+SUMMARY_CACHE_MAX_AGE_DAYS = float(os.getenv("SUMMARY_CACHE_MAX_AGE_DAYS", "30"))
+
+
+def cache_key(model, system_prompt, prompt):
+    digest = hashlib.sha256()
+    for part in (model, system_prompt, prompt):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class SummaryCache:
+
+    def __init__(self, path=SUMMARY_CACHE_PATH, max_entries=SUMMARY_CACHE_MAX_ENTRIES, max_age_days=SUMMARY_CACHE_MAX_AGE_DAYS):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age_s = max_age_days * 86400
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS summaries (
+                key TEXT PRIMARY KEY, summary TEXT, created_at REAL, last_used_at REAL
+            )
+        """)
+        self._conn.commit()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT summary, created_at FROM summaries WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.max_age_s:
+                self.misses += 1
+                perf.count("summary_cache.misses")
+                return None
+            self._conn.execute("UPDATE summaries SET last_used_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            perf.count("summary_cache.hits")
+            return row[0]
+
+    def put(self, key, summary):
+        now = time.time()
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO summaries VALUES (?, ?, ?, ?)", (key, summary, now, now))
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now):
+        removed = self._conn.execute("DELETE FROM summaries WHERE created_at < ?", (now - self.max_age_s,)).rowcount
+        excess = self._conn.execute("SELECT COUNT(*) FROM summaries").fetchone()[0] - self.max_entries
+        if excess > 0:
+            removed += self._conn.execute(
+                "DELETE FROM summaries WHERE key IN (SELECT key FROM summaries ORDER BY last_used_at LIMIT ?)",
+                (excess,),
+            ).rowcount
+        self.evictions += removed
+        perf.count("summary_cache.evictions", removed)
+
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM summaries").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "entries": entries}
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM summaries")
+            self._conn.commit()
@@ -0,0 +1,156 @@
+# Agendador de resumos com IA: pool de threads com concorrência limitada e modo em lote
+#
+# summarize_many recebe (item_id, name, diffs) e devolve (item_id, summary) conforme as
+# chamadas terminam, para a interface ir preenchendo os resultados sem esperar o lote todo.
+# No modo em lote, diffs pequenos são agrupados num único prompt e a resposta é separada
+# pelos marcadores "### [n]"; o que não vier na resposta é resumido individualmente.
+# Prompts já presentes no cache de resumos (summary_cache) não chegam a ser agendados.
+from ai_summary import ERROR_PREFIX, build_prompt, ask_llm, get_llm, summarize_changes, cached_summary, store_summary
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import os
+import perf
+import re
+import threading
+import time
+
+AI_MAX_WORKERS = int(os.getenv("AI_MAX_WORKERS", "4"))
+AI_BATCH_SIZE = int(os.getenv("AI_BATCH_SIZE", "1"))
+AI_BATCH_MAX_CHARS = int(os.getenv("AI_BATCH_MAX_CHARS", "2000"))
+
+_SECTION_RE = re.compile(r"^###\s*\[(\d+)\]\s*$", re.MULTILINE)
+
+
+class SchedulerStats:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.finished = None
+        self.items = 0
+        self.calls = 0
+        self.cached = 0
+        self.item_latencies = []
+
+    def record_call(self, latency, items):
+        with self._lock:
+            self.calls += 1
+            self.items += items
+            self.item_latencies.extend([latency] * items)
+        for _ in range(items):
+            perf.record("llm.record", latency)
+
+    def stop(self):
+        self.finished = time.perf_counter()
+
+    def report(self):
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        latencies = sorted(self.item_latencies)
+        return {
+            "items": self.items,
+            "llm_calls": self.calls,
+            "cached": self.cached,
+            "elapsed_s": elapsed,
+            "throughput_per_s": self.items / elapsed if elapsed > 0 else 0.0,
+            "p50_s": perf.percentile(latencies, 50),
+            "p90_s": perf.percentile(latencies, 90),
+            "p99_s": perf.percentile(latencies, 99),
+        }
+
+
+def summary_diffs(status, record):
+    # Diffs enviados ao modelo: registros novos entram com todos os campos preenchidos como "after"
+    if status == "new":
+        return {f: {"before": "", "after": v} for f, v in record.fields.items() if v.strip()}
+    return record.differences
+
+
+def build_batch_prompt(prompts):
+    prompt = (
+        "Summarize each of the following ServiceNow records separately. "
+        "Answer with one section per record, starting each section with its marker line exactly as given.\n"
+    )
+    for number, record_prompt in enumerate(prompts, start=1):
+        prompt += f"\n### [{number}]\n{record_prompt}\n"
+    return prompt
+
+
+def split_batch_response(text, count):
+    parts = _SECTION_RE.split(text)
+    sections = {}
+    for number, body in zip(parts[1::2], parts[2::2]):
+        number = int(number)
+        if 1 <= number <= count and body.strip():
+            sections[number - 1] = body.strip()
+    return sections
+
+
+def _plan_batches(jobs, batch_size, max_chars):
+    batches, pending = [], []
+    for job in jobs:
+        if batch_size <= 1 or len(job[3]) > max_chars:
+            batches.append([job])
+            continue
+        pending.append(job)
+        if len(pending) >= batch_size:
+            batches.append(pending)
+            pending = []
+    if pending:
+        batches.append(pending)
+    return batches
+
+
+def _run_batch(batch, stats):
+    started = time.perf_counter()
+    if len(batch) == 1:
+        item_id, name, diffs, prompt = batch[0]
+        summary = ask_llm(prompt)
+        stats.record_call(time.perf_counter() - started, 1)
+        store_summary(prompt, summary)
+        return [(item_id, summary)]
+
+    sections = split_batch_response(ask_llm(build_batch_prompt([job[3] for job in batch])), len(batch))
+    stats.record_call(time.perf_counter() - started, len(sections))
+    results = []
+    for position, (item_id, name, diffs, prompt) in enumerate(batch):
+        if position in sections:
+            store_summary(prompt, sections[position])
+            results.append((item_id, sections[position]))
+        else:
+            results.extend(_run_batch([(item_id, name, diffs, prompt)], stats))
+    return results
+
+
+def summarize_many(items, max_workers=None, batch_size=None, max_chars=None, stats=None):
+    # Gera (item_id, summary) na ordem de conclusão; stats (SchedulerStats) acumula vazão e latências
+    stats = stats if stats is not None else SchedulerStats()
+    if get_llm() is None:
+        for item_id, name, diffs in items:
+            yield item_id, summarize_changes(name, diffs)
+        stats.stop()
+        return
+
+    # Resumos já em cache saem na hora; só o restante vai para o pool
+    jobs = []
+    for item_id, name, diffs in items:
+        prompt = build_prompt(name, diffs)
+        summary = cached_summary(prompt)
+        if summary is None:
+            jobs.append((item_id, name, diffs, prompt))
+        else:
+            stats.cached += 1
+            yield item_id, summary
+    batches = _plan_batches(
+        jobs,
+        batch_size or AI_BATCH_SIZE,
+        max_chars or AI_BATCH_MAX_CHARS,
+    )
+    with ThreadPoolExecutor(max_workers=max_workers or AI_MAX_WORKERS) as pool:
+        futures = {pool.submit(_run_batch, batch, stats): batch for batch in batches}
+        for future in as_completed(futures):
+            try:
+                summaries = future.result()
+            except Exception as e:
+                summaries = [(job[0], f"{ERROR_PREFIX} {e}") for job in futures[future]]
+            for item_id, summary in summaries:
+                yield item_id, summary
+    stats.stop()
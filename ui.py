@@ -8,26 +8,68 @@ def app():
 
     
 from logic import process_comparison
+from base_cache import load_base_index
+from utils import BASE_VERSION_PATHS
+from manifest import RunManifest
+from ingest import spool_upload
+from warmup import warm_up
+import perf
 import streamlit as st
-from lxml import etree
 import os
 
+def performance_panel():
+    # Métricas do processo inteiro (todas as sessões), acumuladas desde o início ou o último reset
+    with st.expander("⏱️ Performance"):
+        data = perf.snapshot()
+        if not data["stages"]:
+            st.caption("No pipeline stages recorded yet.")
+        else:
+            st.dataframe([
+                {
+                    "stage": name, "calls": stats["calls"], "items": stats["items"],
+                    "total s": round(stats["total_s"], 3), "self s": round(stats["self_s"], 3),
+                    "p50 ms": round(stats["p50_s"] * 1000, 1), "p90 ms": round(stats["p90_s"] * 1000, 1),
+                    "p99 ms": round(stats["p99_s"] * 1000, 1), "max s": round(stats["max_s"], 3),
+                    "peak RSS growth MB": round(stats["rss_growth_bytes"] / 1024 / 1024, 1), "errors": stats["errors"],
+                }
+                for name, stats in sorted(data["stages"].items(), key=lambda item: -item[1]["self_s"])
+            ], hide_index=True)
+        st.caption(f"Process peak RSS: {data['peak_rss_bytes'] / 1024 / 1024:.1f} MB")
+        if data["counters"]:
+            st.caption(" · ".join(f"{name}: {value}" for name, value in sorted(data["counters"].items())))
+        for error in reversed(data["errors"][-5:]):
+            st.warning(f"[{error['stage']}] {error['message']}")
+        col_json, col_prom, col_reset = st.columns(3)
+        col_json.download_button("Download JSON", perf.to_json(data), file_name="perf.json", mime="application/json")
+        col_prom.download_button("Download Prometheus", perf.to_prometheus(data), file_name="perf.prom", mime="text/plain")
+        if col_reset.button("Reset metrics"):
+            perf.reset()
+            st.rerun()
+
 def app():
     st.set_page_config(page_title="PagerDuty x ServiceNow Customizations Comparator", layout="wide")
     st.title("🧠 PagerDuty x ServiceNow Customizations Comparator with LangChain + Ollama")
-
-    BASE_VERSION_PATHS = {
-        "v7.6": "base_versions/v7.6.xml",
-        "v7.9.1": "base_versions/v7.9.1.xml",
-        "v8.0.1": "base_versions/v8.0.1.xml",
-        "v8.1.0": "base_versions/v8.1.0.xml"
-    }
+    # Langchain e exportadores carregam em segundo plano enquanto o usuário escolhe o arquivo
+    warm_up()
 
     selected_version = st.selectbox("📦 Select base version to compare against:", list(BASE_VERSION_PATHS.keys()))
     base_cache_path = BASE_VERSION_PATHS[selected_version]
     uploaded_custom = st.file_uploader("📂 Upload the customized file", type=["xml"], key="custom")
 
     if os.path.exists(base_cache_path) and uploaded_custom:
-        base_tree = etree.parse(base_cache_path)
-        custom_tree = etree.parse(uploaded_custom)
-        process_comparison(base_tree, custom_tree)
+        # O cliente identifica o manifesto da última execução; por padrão, o nome do arquivo enviado
+        customer = st.text_input("🏷️ Customer / instance (reuses results from its last run):",
+                                 value=os.path.splitext(uploaded_custom.name)[0])
+        base_index = load_base_index(base_cache_path)
+        manifest = RunManifest(customer, base_index["source_hash"]) if customer.strip() else None
+        # Identifica esta comparação para o st.cache_data: trocar de página não refaz a extração
+        upload_id = getattr(uploaded_custom, "file_id", None) or f"{uploaded_custom.name}:{uploaded_custom.size}"
+        run_id = f"{base_index['source_hash']}:{upload_id}:{customer}"
+        # O upload vai para o disco uma vez por arquivo; a extração lê a cópia mapeada (ingest)
+        spooled = st.session_state.get("spooled_custom")
+        if not spooled or spooled[0] != upload_id or not os.path.exists(spooled[1]):
+            uploaded_custom.seek(0)
+            spooled = st.session_state["spooled_custom"] = (upload_id, spool_upload(uploaded_custom))
+        process_comparison(base_index["records"], spooled[1], manifest, run_id)
+
+    performance_panel()
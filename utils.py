@@ -1,8 +1,27 @@
 from lxml import etree
-from collections import defaultdict
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+import csv
+import hashlib
+import json
+import os
+import sys
+import time
+import perf
 
 FIELDS_TO_COMPARE = ["filter_condition", "condition", "active", "script", "template", "when", "order"]
 
+# Processos para decodificar os payloads das versões base (1 = sem pool) e registros por lote
+DECODE_WORKERS = int(os.getenv("DECODE_WORKERS", "1"))
+DECODE_CHUNK_SIZE = int(os.getenv("DECODE_CHUNK_SIZE", "256"))
+
+BASE_VERSION_PATHS = {
+    "v7.6": "base_versions/v7.6.xml",
+    "v7.9.1": "base_versions/v7.9.1.xml",
+    "v8.0.1": "base_versions/v8.0.1.xml",
+    "v8.1.0": "base_versions/v8.1.0.xml"
+}
+
 FRIENDLY_CLASS_NAMES = {
     "sys_script": "Business Rule",
     "sys_script_include": "Script Include",
@@ -34,50 +53,231 @@ FRIENDLY_CLASS_NAMES = {
 def get_friendly_class_name(class_name):
     return FRIENDLY_CLASS_NAMES.get(class_name, class_name)
 
+FIELD_INDEX = {field: index for index, field in enumerate(FIELDS_TO_COMPARE)}
+DIGEST_SIZE = 8
+
+def _field_digest_bytes(value):
+    # Mesmo critério da comparação: espaços nas pontas não contam como mudança
+    return hashlib.blake2b((value or "").strip().encode("utf-8"), digest_size=DIGEST_SIZE).digest()
+
+def field_digest(value):
+    return _field_digest_bytes(value).hex()
+
+def record_digests(values):
+    # values na ordem de FIELDS_TO_COMPARE (tupla) ou um dict de campos. Retorna os digests por campo
+    # concatenados em bytes e um digest do registro inteiro, usado para descartar iguais com uma só checagem
+    if isinstance(values, dict):
+        values = tuple(values[field] for field in FIELDS_TO_COMPARE)
+    digests = b"".join(_field_digest_bytes(value) for value in values)
+    return digests, combine_digests(digests)
+
+def combine_digests(digests):
+    return hashlib.blake2b(digests.hex().encode("ascii"), digest_size=8).hexdigest()
+
+class Record:
+    # Registro compacto: valores numa tupla na ordem de FIELDS_TO_COMPARE, digests por campo num único
+    # bytes e nome da classe internado. Não há dict por registro e group_by_class não copia nada.
+    # Com load_values (ex.: índice base em SQLite), o texto não fica em memória e é lido sob demanda.
+    __slots__ = ("key", "name", "class_name", "_values", "digests", "digest", "load_values")
+
+    def __init__(self, key, name, class_name, values=None, digests=None, digest=None, load_values=None):
+        self.key = key
+        self.name = name
+        self.class_name = sys.intern(class_name)
+        self._values = values
+        if digests is None:
+            digests, digest = record_digests(values)
+        self.digests = digests
+        self.digest = digest
+        self.load_values = load_values
+
+    @property
+    def values(self):
+        return self._values if self._values is not None else self.load_values(self.key)
+
+    @property
+    def fields(self):
+        return dict(zip(FIELDS_TO_COMPARE, self.values))
+
+    def field(self, field):
+        return self.values[FIELD_INDEX[field]]
+
+    def changed_fields(self, other):
+        # Campos cujo digest difere entre os dois registros, sem olhar o texto
+        return [
+            field for index, field in enumerate(FIELDS_TO_COMPARE)
+            if self.digests[index * DIGEST_SIZE:(index + 1) * DIGEST_SIZE] != other.digests[index * DIGEST_SIZE:(index + 1) * DIGEST_SIZE]
+        ]
+
+    def __eq__(self, other):
+        if not isinstance(other, Record):
+            return NotImplemented
+        return (self.key, self.name, self.class_name, self.digests, self.values) == (other.key, other.name, other.class_name, other.digests, other.values)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"Record({self.key!r}, {self.name!r}, {self.class_name!r})"
+
+def _release(node):
+    # Libera o elemento já consumido e os irmãos anteriores para o iterparse não acumular a árvore
+    node.clear()
+    parent = node.getparent()
+    if parent is not None:
+        while node.getprevious() is not None:
+            del parent[0]
+
+_FIELD_SET = frozenset(FIELDS_TO_COMPARE)
+_NAME_TAGS = frozenset(("name", "sys_name"))
+
+def _scan_fields(element):
+    # Uma única passada pelos filhos em vez de um find/findtext por campo; vale a primeira ocorrência
+    values = {}
+    names = {}
+    for el in element:
+        tag = el.tag
+        if tag in _FIELD_SET:
+            values.setdefault(tag, el.text or "")
+        elif tag in _NAME_TAGS:
+            names.setdefault(tag, el.text or "")
+    return values, names.get("name") or names.get("sys_name") or None
+
+def decode_payload(key, payload):
+    # Retorna uma tupla compacta (key, name, class, valores na ordem de FIELDS_TO_COMPARE) ou None
+    if not (payload and key):
+        return None
+    try:
+        inner_xml = etree.fromstring(payload.strip().encode("utf-8"))
+        record_update = inner_xml if inner_xml.tag == "record_update" else inner_xml.find("record_update")
+        if record_update is not None:
+            for child in record_update:
+                if not isinstance(child.tag, str):
+                    continue
+                if not child.tag.startswith("sys_"):
+                    continue
+                values, name = _scan_fields(child)
+                if not values:
+                    continue
+                return key.strip().lower(), name, child.tag, tuple(values.get(field, "") for field in FIELDS_TO_COMPARE)
+    except Exception as e:
+        perf.log_error("decode_payload", f"⚠️ Erro ao processar payload em {key}: {e}")
+    return None
+
+def _record_from_tuple(item):
+    key, name, class_name, values = item
+    return key, Record(key, name, class_name, values)
+
+def _base_record_from_node(node):
+    item = decode_payload(node.findtext("name"), node.findtext("payload"))
+    return _record_from_tuple(item) if item else None
+
+def _custom_record_from_node(node):
+    sys_id = (node.findtext("sys_id") or "").strip()
+    class_name = (node.findtext("sys_class_name") or node.tag).strip()
+    name = node.findtext("name") or node.findtext("sys_name")
+    if sys_id and class_name:
+        key = f"{class_name}_{sys_id}".strip().lower()
+        values, _ = _scan_fields(node)
+        return key, Record(key, name, class_name, tuple(values.get(field, "") for field in FIELDS_TO_COMPARE))
+    return None
+
+@perf.timed("extract_base_records")
 def extract_base_records(tree):
     records = {}
     for node in tree.findall(".//sys_update_xml"):
-        key = node.findtext("name")
-        payload = node.findtext("payload")
-        if payload and key:
-            try:
-                inner_xml = etree.fromstring(payload.strip().encode("utf-8"))
-                record_update = inner_xml if inner_xml.tag == "record_update" else inner_xml.find("record_update")
-                if record_update is not None:
-                    for child in record_update:
-                        if not isinstance(child.tag, str):
-                            continue
-                        if not child.tag.startswith("sys_"):
-                            continue
-                        found_field = any(child.find(field) is not None for field in FIELDS_TO_COMPARE)
-                        if not found_field:
-                            continue
-                        fields = {field: child.findtext(field) or "" for field in FIELDS_TO_COMPARE}
-                        name = child.findtext("name") or child.findtext("sys_name")
-                        class_name = child.tag
-                        records[key.strip().lower()] = {"name": name, "fields": fields, "class": class_name}
-                        break
-            except Exception as e:
-                print(f"⚠️ Erro ao processar payload em {key}: {e}")
+        item = _base_record_from_node(node)
+        if item:
+            records[item[0]] = item[1]
     return records
 
+@perf.timed("extract_custom_records")
 def extract_custom_records(tree):
     records = {}
     for node in tree.getroot():
         if not isinstance(node.tag, str):
             continue
-        sys_id = (node.findtext("sys_id") or "").strip()
-        class_name = (node.findtext("sys_class_name") or node.tag).strip()
-        name = node.findtext("name") or node.findtext("sys_name")
-        fields = {field: node.findtext(field) or "" for field in FIELDS_TO_COMPARE}
-        if sys_id and class_name:
-            key = f"{class_name}_{sys_id}".strip().lower()
-            records[key] = {"name": name, "fields": fields, "class": class_name}
+        item = _custom_record_from_node(node)
+        if item:
+            records[item[0]] = item[1]
     return records
 
+def _decode_chunk(chunk):
+    return [item for item in (decode_payload(key, payload) for key, payload in chunk) if item]
+
+def _payload_chunks(source, chunk_size):
+    chunk = []
+    for _, node in etree.iterparse(source, events=("end",), tag="sys_update_xml", huge_tree=True):
+        chunk.append((node.findtext("name"), node.findtext("payload")))
+        _release(node)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def iter_base_records(source, workers=1, chunk_size=DECODE_CHUNK_SIZE):
+    # Versão em streaming de extract_base_records: aceita caminho ou arquivo e gera (key, record)
+    # Com workers > 1, os payloads são decodificados em lotes num pool de processos, mantendo a ordem
+    if workers <= 1:
+        for _, node in etree.iterparse(source, events=("end",), tag="sys_update_xml", huge_tree=True):
+            item = _base_record_from_node(node)
+            _release(node)
+            if item:
+                yield item
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for chunk in _payload_chunks(source, chunk_size):
+            pending.append(pool.submit(_decode_chunk, chunk))
+            # Limita os lotes em voo para a memória não crescer com o tamanho do arquivo
+            while len(pending) > workers * 2:
+                yield from map(_record_from_tuple, pending.popleft().result())
+        while pending:
+            yield from map(_record_from_tuple, pending.popleft().result())
+
+def iter_custom_records(source):
+    # Versão em streaming de extract_custom_records: processa apenas os filhos diretos da raiz
+    depth = 0
+    for event, node in etree.iterparse(source, events=("start", "end"), huge_tree=True):
+        if event == "start":
+            depth += 1
+            continue
+        depth -= 1
+        if depth != 1:
+            continue
+        item = _custom_record_from_node(node) if isinstance(node.tag, str) else None
+        _release(node)
+        if item:
+            yield item
+
 def group_by_class(records_dict):
+    # Os registros já carregam key e class_name, então o agrupamento só referencia os objetos
     grouped = defaultdict(list)
-    for key, record in records_dict.items():
-        record_with_key = {**record, "key": key}
-        grouped[record["class"]].append(record_with_key)
+    for record in records_dict.values():
+        grouped[record.class_name].append(record)
     return grouped
+
+def write_table(rows, out_base, formats, columns, flatten=None):
+    # Grava {out_base}.jsonl e/ou {out_base}.csv; flatten(row) adapta a linha para o CSV (ex.: listas em "a;b")
+    rows = list(rows)
+    if "jsonl" in formats:
+        with open(f"{out_base}.jsonl", "w", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+    if "csv" in formats:
+        with open(f"{out_base}.csv", "w", encoding="utf-8", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=columns)
+            writer.writeheader()
+            writer.writerows(map(flatten, rows) if flatten else rows)
+
+def prune_older_than(directory, max_age_s, suffix=None):
+    # Apaga os arquivos de directory (só os terminados em suffix, se dado) sem modificação há mais de max_age_s
+    cutoff = time.time() - max_age_s
+    for entry in os.scandir(directory):
+        try:
+            if (suffix is None or entry.name.endswith(suffix)) and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+        except OSError:
+            # Ainda aberto ou mapeado por outra sessão (Windows) ou já removido
+            pass
@@ -0,0 +1,44 @@
+# Aquecimento das dependências pesadas
+#
+# O núcleo da comparação (utils, compare, base_cache, ingest, batch, drift) não importa langchain,
+# xhtml2pdf, pypdf, python-docx nem transformers: cada um é importado no primeiro uso (resumo,
+# exportação, comparador_xml). warm_up faz esses imports antes, por padrão numa thread em segundo
+# plano, para a interface abrir logo e o primeiro resumo ou PDF não pagar o custo. Cada alvo
+# aparece nas métricas como "warm_up.<módulo>"; WARM_UP=false desliga.
+import importlib
+import os
+import threading
+import perf
+
+WARM_UP_ENABLED = os.getenv("WARM_UP", "true").lower() == "true"
+WARM_UP_TARGETS = ["ai_summary", "export"]
+
+_lock = threading.Lock()
+_started = False
+
+
+def _run(targets):
+    for name in targets:
+        with perf.stage(f"warm_up.{name}"):
+            try:
+                importlib.import_module(name).warm_up()
+            except Exception as e:
+                # Dependência opcional ausente ou modelo fora do ar: o erro reaparece no primeiro uso
+                perf.log_error(f"warm_up.{name}", f"⚠️ Aquecimento de {name} falhou: {e}")
+
+
+def warm_up(targets=None, background=True):
+    # Só a primeira chamada do processo aquece; em segundo plano, retorna a thread
+    global _started
+    if not WARM_UP_ENABLED:
+        return None
+    with _lock:
+        if _started:
+            return None
+        _started = True
+    if not background:
+        _run(targets or WARM_UP_TARGETS)
+        return None
+    thread = threading.Thread(target=_run, args=(targets or WARM_UP_TARGETS,), name="warm-up", daemon=True)
+    thread.start()
+    return thread